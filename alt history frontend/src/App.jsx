@@ -146,8 +146,14 @@ function App() {
         case 'timeline':
           if (args[0] === 'day' && args[1]) {
             const dayIndex = parseInt(args[1])
-            const event = await api.getEventByDay(dayIndex)
-            response = formatEvent(event)
+            const day = await api.getDay(dayIndex)
+            response = [
+              ...formatEvent(day.timeline),
+              'Proposals:',
+              ...day.proposals.map(p => `  Model ${p.model}: ${p.title || 'N/A'}`),
+              `Judgement: ${day.judgement ? `${day.judgement.decision} - ${day.judgement.reason}` : 'N/A'}`,
+              ''
+            ]
           } else {
             const limit = args[0] ? parseInt(args[0]) : 10
             const events = await api.getTimeline(0, limit)
@@ -198,11 +204,24 @@ function App() {
           if (!args[0]) {
             response = ['Error: Admin key required', 'Usage: simulate <admin-key>', '']
           } else {
-            const result = await api.simulateDay(args[0])
-            response = [
-              '✓ Simulation triggered successfully!',
+            // Stage progress is printed above the "Loading..." line as it arrives
+            const result = await api.streamSimulation(args[0], (name, data) => {
+              if (name === 'stage') {
+                const source = data.source ? ` (${data.source})` : ''
+                setOutput(prev => [...prev.slice(0, -1), `  ${data.stage}${source}: ${data.status}`, prev[prev.length - 1]])
+              }
+            })
+            response = result.status === 'succeeded' ? [
+              '✓ Simulation completed successfully!',
+              `  Job ID: ${result.job_id}`,
               `  Day Index: ${result.day_index}`,
-              `  Message: ${result.message}`,
+              `  Status: ${result.status}`,
+              ''
+            ] : [
+              '✗ Simulation failed',
+              `  Job ID: ${result.job_id}`,
+              `  Status: ${result.status}`,
+              `  Error: ${result.error || 'unknown'}`,
               ''
             ]
           }
@@ -57,6 +57,25 @@ export async function getEventByDay(dayIndex) {
     return fetchAPI(`/timeline/${dayIndex}`);
 }
 
+/**
+ * Get a whole day in one request: the accepted event, its subtopic, both proposals and the judgement
+ * @param {number} dayIndex - The day index to retrieve
+ */
+export async function getDay(dayIndex) {
+    return fetchAPI(`/days/${dayIndex}`);
+}
+
+/**
+ * Get whole days in a range, oldest first
+ * @param {number} from - First day index
+ * @param {number} to - Last day index
+ * @param {number} limit - Maximum number of days to return (max 100)
+ */
+export async function getDays(from = 1, to = null, limit = 20) {
+    const range = to === null ? '' : `&to=${to}`;
+    return fetchAPI(`/days?from=${from}${range}&limit=${limit}`);
+}
+
 /**
  * Get paginated subtopics
  * @param {number} skip - Number of items to skip
@@ -103,7 +122,7 @@ export async function getSchedulerHealth() {
 // ============================================================================
 
 /**
- * Trigger daily simulation
+ * Queue the daily simulation; resolves with the job (poll it with getSimulationJob)
  * @param {string} adminKey - Admin API key
  */
 export async function simulateDay(adminKey) {
@@ -115,6 +134,68 @@ export async function simulateDay(adminKey) {
     });
 }
 
+/**
+ * Get the status of a queued simulation job
+ * @param {string} adminKey - Admin API key
+ * @param {string} jobId - Job ID returned by simulateDay
+ */
+export async function getSimulationJob(adminKey, jobId) {
+    return fetchAPI(`/admin/jobs/${encodeURIComponent(jobId)}`, {
+        headers: {
+            'x-admin-key': adminKey,
+        },
+    });
+}
+
+/**
+ * Queue the daily simulation and follow its progress as server-sent events.
+ * Resolves with the final job status once it succeeds or fails.
+ * @param {string} adminKey - Admin API key
+ * @param {function} onEvent - Called with (eventName, data) for every `stage`, `delta` and `job` event
+ */
+export async function streamSimulation(adminKey, onEvent = () => {}) {
+    const response = await fetch(`${API_BASE_URL}/admin/simulate/day/stream`, {
+        method: 'POST',
+        headers: {
+            'x-admin-key': adminKey,
+            'ngrok-skip-browser-warning': 'true',
+        },
+    });
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.detail || `HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let job = null;
+
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; comment lines (keep-alives) start with ':'
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let name = 'message';
+            const data = [];
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) name = line.slice(6).trim();
+                else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+            }
+            if (!data.length) continue;
+            const payload = JSON.parse(data.join('\n'));
+            if (name === 'job') job = { ...job, ...payload };
+            onEvent(name, payload);
+        }
+    }
+    return job;
+}
+
 /**
  * Reset the entire simulation (DESTRUCTIVE)
  * @param {string} adminKey - Admin API key
@@ -12,16 +12,78 @@ class Settings(BaseSettings):
     # Database
     MONGO_URI: str = "mongodb://localhost:27017"
     DB_NAME: str = "alternate_history"
-    UNIVERSE_ID: str = "cold_war_no_moon_landing"
+    UNIVERSE_ID: str = "cold_war_no_moon_landing" # Default universe for routes without a universe id
+    UNIVERSE_IDS: str = "" # Comma-separated universes to simulate each tick; empty means every stored universe
+    DB_EXECUTOR_WORKERS: int = 32 # Threads serving async queries (keep below maxPoolSize)
+    VERIFY_INDEXES_IN_BACKGROUND: bool = True # Create/verify indexes off the startup path instead of before serving
+    MONGO_TRANSACTIONS: bool = True # Commit each simulated day in one transaction when MongoDB is a replica set
+    EXPORT_BATCH_SIZE: int = 500 # Documents fetched per round trip by the streaming export
+    SNAPSHOT_DIR: str = "snapshots" # Pre-rendered timeline files written after each day; empty disables them
+    SEARCH_MAX_MATCHES: int = 1000 # Best matches that search totals and facets are computed over
+    SEARCH_FACET_SIZE: int = 20 # Tags returned in the search tag facet
     
     # Security
     ADMIN_API_KEY: str = "secret-admin-key" # Change this in production!
 
     # Scheduler
     ENABLE_SCHEDULER: bool = True
+    LEADER_ELECTION: bool = True # Only the process holding the Mongo scheduler lease runs the cron
+    LEASE_TTL: float = 30.0 # Seconds the lease stays valid without a renewal
+    LEASE_RENEW_INTERVAL: float = 10.0 # Seconds between lease renewals (and takeover attempts by standbys)
     SCHEDULE_TIME: str = "13:15" # HH:MM
     TIMEZONE: str = "Asia/Kolkata"
-    API_BASE_URL: str = "http://localhost:8000"
+
+    # LLM providers
+    LLM_REQUEST_TIMEOUT: float = 120.0 # Seconds per provider call
+    LLM_CONNECT_TIMEOUT: float = 10.0
+    LLM_MAX_CONNECTIONS: int = 20 # Shared keep-alive pool across OpenAI-compatible providers
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_PROVIDER_MAX_IN_FLIGHT: int = 4 # Concurrent requests per provider across all universes
+    LLM_MAX_IN_FLIGHT: str = "" # Per-provider overrides of LLM_PROVIDER_MAX_IN_FLIGHT, e.g. "gemini=2"
+    LLM_RPM: str = "qwen=20,deepseek=20,gemini=10,groq=30" # Requests per minute by provider or model; missing means unlimited
+    LLM_TPM: str = "gemini=250000,groq=12000" # Estimated tokens per minute by provider or model; missing means unlimited
+    LLM_RATE_BURST: float = 0.1 # Fraction of a minute's budget that may be spent at once
+    LLM_RATE_LIMIT_COOLDOWN: float = 10.0 # Seconds a provider is paused after a 429 without Retry-After
+    LLM_RETRY_AFTER_MAX: float = 120.0 # Cap on the pause a provider's Retry-After can impose
+    LLM_CACHE_MODE: str = "off" # off | read_write | record | replay
+    LLM_CACHE_DIR: str = ".llm_cache"
+    LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024 # Least recently used entries are evicted past this size
+
+    # LLM routing: comma-separated providers per stage, tried in order
+    SUBTOPIC_PROVIDERS: str = "qwen,groq,deepseek"
+    MODEL_A_PROVIDERS: str = "gemini,qwen"
+    MODEL_B_PROVIDERS: str = "deepseek,qwen"
+    JUDGE_PROVIDERS: str = "groq,qwen"
+    LLM_MAX_ATTEMPTS: int = 3 # Passes over a stage's chain before the stage fails
+    LLM_BACKOFF_BASE: float = 1.0 # Seconds; doubled each attempt, with full jitter
+    LLM_BACKOFF_MAX: float = 16.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 3 # Consecutive failures that open a provider's circuit
+    LLM_CIRCUIT_RESET_TIMEOUT: float = 60.0 # Seconds before an open circuit lets a probe through
+    LLM_HEDGING: bool = True # Send a second request when the first runs past its usual latency
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # Successful calls observed before a provider is hedged
+    LLM_HEDGE_MIN_DELAY: float = 5.0 # Never hedge sooner than this many seconds
+
+    # Public response cache
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+    RESPONSE_CACHE_TTL: float = 300.0 # Seconds; bounds staleness in workers that did not perform the write
+    RESPONSE_CACHE_MAX_AGE: int = 60 # Cache-Control max-age sent to browsers and CDNs
+
+    # Pipeline
+    MAX_CONCURRENT_UNIVERSES: int = 4 # Universes (simulation jobs) run in parallel
+    SSE_HEARTBEAT_INTERVAL: float = 15.0 # Seconds between keep-alive comments on idle event streams
+    SSE_QUEUE_SIZE: int = 1000 # Buffered events per stream subscriber; token deltas are dropped first
+    JOB_STALE_AFTER: float = 1800.0 # Seconds without progress before a queued/running job counts as abandoned
+    CONCURRENT_PROPOSALS: bool = True # Run Model A and Model B side by side
+    PROPOSAL_STAGE_TIMEOUT: float = 240.0 # Seconds before the judge proceeds without a late proposal
+    CONTEXT_RECENT_EVENTS: int = 15 # Latest timeline events considered for each prompt
+    SUBTOPIC_TIMELINE_TOKENS: int = 2500 # Token budgets for the packed recent timeline per stage
+    PROPOSAL_TIMELINE_TOKENS: int = 3000
+    JUDGE_TIMELINE_TOKENS: int = 2000
+    JUDGE_PROPOSAL_TOKENS: int = 1500 # Per proposal shown to the judge
+    SUBTOPIC_CONTEXT_K: int = 25 # Most relevant past subtopics shown to the subtopic model
+    SUBTOPIC_DUPLICATE_THRESHOLD: float = 0.8 # Shingle similarity at which a new subtopic is rejected
+    PROMPT_TEMPLATE_RELOAD: bool = True # Re-read a template when its mtime changes
 
     class Config:
         env_file = ".env"
@@ -1,12 +1,95 @@
-from pymongo import MongoClient
+import asyncio
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from pymongo import InsertOne, MongoClient, ReplaceOne
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from app.config import settings
 from app.utils.logging import logger
+from app.utils.metrics import metrics
+from app.utils.startup import startup_report
+
+# (collection, filter) that must still match a document for a fenced write to go ahead
+Fence = Tuple[str, Dict[str, Any]]
+
+
+class StaleFenceError(RuntimeError):
+    """A fenced write found its fence no longer matching, e.g. a lease that has passed to another process."""
+
+
+MONGO_SECONDS = metrics.histogram("mongo_operation_duration_seconds", "Time spent in Mongo calls made through AsyncCollection, including executor queueing", ["collection", "operation"])
+
+
+class AsyncCollection:
+    """
+    Awaitable facade over a pymongo collection.
+    Each call runs on the database's bounded executor, so slow queries
+    never stall the event loop and concurrent readers proceed in parallel.
+    """
+    def __init__(self, collection, executor: ThreadPoolExecutor):
+        self.collection = collection
+        self._executor = executor
+
+    async def _run(self, operation: str, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with MONGO_SECONDS.time(collection=self.collection.name, operation=operation):
+            return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        return await self._run("find_one", self.collection.find_one, filter, *args, **kwargs)
+
+    async def find(self, filter: Optional[Dict[str, Any]] = None, projection=None, sort=None, skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+        """Run a query and materialize the cursor on the executor."""
+        def _query():
+            return list(self.collection.find(filter, projection, sort=sort, skip=skip, limit=limit))
+        return await self._run("find", _query)
+
+    async def iterate(self, filter: Optional[Dict[str, Any]] = None, projection=None, sort=None, batch_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream a query from one cursor, `batch_size` documents at a time. Each batch is
+        fetched on the executor, so only one is held in memory however large the result.
+        """
+        cursor = self.collection.find(filter, projection, sort=sort, batch_size=batch_size)
+        try:
+            while True:
+                batch = await self._run("iterate", lambda: list(islice(cursor, batch_size)))
+                if batch:
+                    yield batch
+                if len(batch) < batch_size:
+                    return
+        finally:
+            cursor.close()
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self._run("aggregate", lambda: list(self.collection.aggregate(pipeline)))
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None) -> List[Any]:
+        return await self._run("distinct", self.collection.distinct, key, filter)
+
+    async def insert_one(self, document: Dict[str, Any]):
+        return await self._run("insert_one", self.collection.insert_one, document)
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], **kwargs):
+        return await self._run("replace_one", self.collection.replace_one, filter, replacement, **kwargs)
+
+    async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], **kwargs):
+        return await self._run("update_one", self.collection.update_one, filter, update, **kwargs)
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], **kwargs) -> Optional[Dict[str, Any]]:
+        return await self._run("find_one_and_update", self.collection.find_one_and_update, filter, update, **kwargs)
+
+    async def delete_many(self, filter: Dict[str, Any]):
+        return await self._run("delete_many", self.collection.delete_many, filter)
 
 
 class Database:
     client: MongoClient = None
     db = None
+    executor: ThreadPoolExecutor = None
+    _supports_transactions: Optional[bool] = None
 
     def connect(self):
         try:
@@ -30,8 +113,13 @@ class Database:
             self.client.admin.command('ping')
             
             self.db = self.client[settings.DB_NAME]
+            self._supports_transactions = None
             logger.info(f"Connected to MongoDB -> {settings.DB_NAME}")
-            self._ensure_indexes()
+            if settings.VERIFY_INDEXES_IN_BACKGROUND:
+                # Indexes already exist on every start but the first, so serving need not wait for the check
+                self._get_executor().submit(self._verify_indexes)
+            else:
+                self._verify_indexes()
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             logger.error("Please check your MONGO_URI in .env file")
@@ -41,17 +129,96 @@ class Database:
             raise e
     
     def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
         if self.client:
             self.client.close()
             logger.info("MongoDB connection closed.")
 
+    def _verify_indexes(self):
+        started = time.perf_counter()
+        try:
+            self._ensure_indexes()
+        except Exception as e:
+            logger.error(f"Failed to verify MongoDB indexes: {e}")
+            if not settings.VERIFY_INDEXES_IN_BACKGROUND:
+                raise
+        else:
+            startup_report.record("indexes", time.perf_counter() - started, background=settings.VERIFY_INDEXES_IN_BACKGROUND)
+
     def _ensure_indexes(self):
         collections = ["timeline", "subtopics", "proposals", "judgements"]
         for col_name in collections:
-            self.db[col_name].create_index([("universe_id", 1), ("day_index", -1)])
+            # _id is the list endpoints' tie-break, so their (day_index, _id) sort is served by the index in either direction
+            self.db[col_name].create_index([("universe_id", 1), ("day_index", -1), ("_id", -1)])
+        # Text queries must name the universe, which the compound prefix turns into an index bound
+        self.db["search"].create_index(
+            [("universe_id", 1), ("title", "text"), ("text", "text")],
+            weights={"title": 5, "text": 1},
+            name="search_text"
+        )
+        # Multikey: one entry per tag, so tag filters and facets only touch matching days.
+        # Both end in search's (day_index desc, _id) order, so non-text searches stop at SEARCH_MAX_MATCHES
+        self.db["search"].create_index([("universe_id", 1), ("tags", 1), ("day_index", -1), ("_id", 1)])
+        self.db["search"].create_index([("universe_id", 1), ("day_index", -1), ("_id", 1)])
         logger.info("MongoDB indexes verified.")
 
     def get_collection(self, name: str):
         return self.db[name]
 
+    @property
+    def supports_transactions(self) -> bool:
+        """Multi-document transactions need a replica set or a sharded cluster."""
+        if self._supports_transactions is None:
+            try:
+                hello = self.client.admin.command("hello")
+                self._supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+            except Exception:
+                self._supports_transactions = False
+        return settings.MONGO_TRANSACTIONS and self._supports_transactions
+
+    def bulk_upsert(self, batches: Dict[str, List[Dict[str, Any]]], upsert: bool = True, fence: Optional[Callable[[], Fence]] = None):
+        """
+        Upsert documents by _id, one bulk write per collection in the order given.
+        All collections are written in a single transaction when the deployment supports it.
+        `upsert=False` inserts instead, which skips the _id lookups but fails on existing documents.
+
+        With a `fence`, its document is first touched with a conditional update and nothing is
+        written unless that matches. Inside a transaction the touch also makes any concurrent
+        change to the fence document (a lease takeover) a write conflict, so the fence holds
+        for the whole write; without transactions it is checked immediately before writing.
+        """
+        def write(session=None):
+            if fence is not None:
+                name, condition = fence()
+                touched = self.db[name].update_one(condition, {"$set": {"fenced_write_at": datetime.now(timezone.utc)}}, session=session)
+                if touched.matched_count == 0:
+                    raise StaleFenceError(f"Fenced write refused: {name} {condition.get('_id')} has moved on")
+            for name, docs in batches.items():
+                if docs:
+                    requests = [ReplaceOne({"_id": d["_id"]}, d, upsert=True) if upsert else InsertOne(d) for d in docs]
+                    self.db[name].bulk_write(requests, ordered=False, session=session)
+
+        if not self.supports_transactions:
+            write()
+            return
+        with self.client.start_session() as session:
+            session.with_transaction(write)
+
+    async def run(self, operation: str, fn, *args, **kwargs):
+        """Run a multi-collection operation on the database executor."""
+        loop = asyncio.get_running_loop()
+        with MONGO_SECONDS.time(collection="*", operation=operation):
+            return await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            # Bounded below maxPoolSize so queued queries wait here rather than on the pool
+            self.executor = ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+        return self.executor
+
+    def get_async_collection(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self.db[name], self._get_executor())
+
 db = Database()
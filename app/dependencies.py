@@ -1,6 +1,11 @@
+import re
+from typing import Optional
 from fastapi import Header, HTTPException, status
 from app.config import settings
 
+# Universe ids name job ids, cache keys and snapshot directories, so they are kept to safe characters
+UNIVERSE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 async def verify_admin_key(x_admin_key: str = Header(...)):
     if x_admin_key != settings.ADMIN_API_KEY:
         raise HTTPException(
@@ -8,3 +13,19 @@ async def verify_admin_key(x_admin_key: str = Header(...)):
             detail="Invalid Admin Key",
         )
     return x_admin_key
+
+def validate_universe_id(universe_id: str) -> str:
+    if not UNIVERSE_ID_RE.match(universe_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid universe id: {universe_id!r}",
+        )
+    return universe_id
+
+async def get_universe_id(universe_id: Optional[str] = None) -> str:
+    """
+    Resolve the universe a request targets: the {universe_id} path segment on
+    /universes/{universe_id}/... routes, a ?universe_id= query parameter on the
+    unprefixed routes, or the configured default universe.
+    """
+    return validate_universe_id(universe_id or settings.UNIVERSE_ID)
@@ -1,12 +1,26 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import public, admin
+from app.config import settings
 from app.database import db
 from app.utils.logging import setup_logging
 from app.services.scheduler import scheduler_service
+from app.services.leader import scheduler_lease
+from app.services.jobs import job_service
+from app.services.llm_cache import llm_cache
+from app.services.llm_router import llm_router
+from app.services.llm_service import llm_service
+from app.services.pipeline import PIPELINE_TEMPLATES
+from app.utils.prompts import prompt_registry
+from app.utils.metrics import metrics
+from app.utils.startup import startup_report
 
 # Setup logging
 setup_logging()
+startup_report.record("import", time.perf_counter() - _import_started)
 
 app = FastAPI(
     title="Alternate History Engine API",
@@ -21,35 +35,93 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+HTTP_SECONDS = metrics.histogram("http_request_duration_seconds", "API request latency by route template", ["method", "route", "status"])
+
+def route_template(request: Request) -> str:
+    """Matched route as a template (/universes/{universe_id}/timeline), keeping label cardinality bounded."""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    # FastAPI releases that keep included routers unflattened only record the router prefix
+    # on the effective route; older ones fold it into the route's own path format
+    context = (request.scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(route, "path_format", None) or route.path
+    return request.scope.get("root_path", "") + path
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route_template(request),
+            status=status
+        )
+
 # Database Connection
 @app.on_event("startup")
 def startup_db_client():
-    db.connect()
-    scheduler_service.start()
+    with startup_report.phase("prompts"):
+        prompt_registry.validate(PIPELINE_TEMPLATES)
+    with startup_report.phase("mongo"):
+        db.connect()
+    with startup_report.phase("job_worker"):
+        job_service.start()
+    with startup_report.phase("scheduler"):
+        scheduler_service.start()
+    startup_report.ready()
 
 @app.on_event("shutdown")
 def shutdown_db_client():
     scheduler_service.shutdown()
+    # Also closes the LLM connection pool, which lives on the job worker's loop
+    job_service.shutdown()
     db.close()
 
 # Routers
 app.include_router(public.router, tags=["Public"])
+app.include_router(public.router, prefix="/universes/{universe_id}", tags=["Public"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/startup")
+async def startup_health_check():
+    """Seconds spent importing the app and in each startup step, plus steps finished in the background."""
+    return startup_report.summary()
+
 @app.get("/health/scheduler")
 async def scheduler_health_check():
+    lease = await scheduler_lease.status() if settings.ENABLE_SCHEDULER and settings.LEADER_ELECTION else None
     if scheduler_service.scheduler and scheduler_service.scheduler.running:
         job = scheduler_service.scheduler.get_job(scheduler_service.job_id)
         next_run = job.next_run_time if job else None
         return {
             "status": "running",
             "next_run_time": next_run,
-            "timezone": str(scheduler_service.scheduler.timezone)
+            "timezone": str(scheduler_service.scheduler.timezone),
+            "lease": lease
         }
-    return {"status": "stopped"}
+    # Standby: another process holds the lease and runs the cron
+    return {"status": "standby" if lease else "stopped", "lease": lease}
+
+@app.get("/health/llm")
+async def llm_health_check():
+    """Circuit breaker state, recent latency and rate limiter state per LLM provider, plus response cache stats."""
+    return {"providers": llm_router.status(), "rate_limits": llm_service.limits_status(), "cache": llm_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Pipeline, LLM, Mongo and API metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
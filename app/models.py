@@ -20,6 +20,7 @@ class Proposal(BaseModel):
     model: str
     subtopic: str
     created_at: datetime
+    provider: Optional[str] = None # LLM provider that answered, after any failover
     # Allow extra fields since models output variable JSON
     class Config:
         extra = "allow"
@@ -30,7 +31,44 @@ class Judgment(BaseModel):
     reason: str
     created_at: datetime
 
-class SimulationResult(BaseModel):
+class DayView(BaseModel):
     day_index: int
-    status: str = "success"
-    message: str
+    timeline: TimelineEvent
+    subtopic: Optional[Subtopic] = None
+    proposals: List[Proposal] = []
+    judgement: Optional[Judgment] = None
+
+class SearchHit(BaseModel):
+    kind: str # timeline | subtopic | proposal
+    day_index: int
+    title: str
+    snippet: str
+    tags: List[str]
+    model: Optional[str] = None # Proposals only
+    score: Optional[float] = None # Text relevance, for text queries
+    created_at: Optional[datetime] = None
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class SearchResponse(BaseModel):
+    total: int
+    capped: bool # True when more matches exist than SEARCH_MAX_MATCHES
+    results: List[SearchHit]
+    facets: Dict[str, List[FacetCount]]
+
+class SimulationJob(BaseModel):
+    job_id: str = Field(validation_alias="_id")
+    universe_id: str
+    day_index: int
+    status: str
+    stage: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+    events: List[Dict[str, Any]] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    message: Optional[str] = None
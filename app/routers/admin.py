@@ -1,46 +1,160 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.dependencies import verify_admin_key
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from app.dependencies import verify_admin_key, get_universe_id, validate_universe_id
+from app.services.jobs import ACTIVE_STATUSES, job_service
 from app.services.pipeline import pipeline_service
-from app.models import SimulationResult
+from app.services.search import SEARCH_COLLECTION, reindex
+from app.services.snapshots import snapshot_service
+from app.services.unit_of_work import STAGING_COLLECTION
+from app.models import SimulationJob
 from app.database import db
-from app.config import settings
 from app.utils.logging import logger
+from app.utils.response_cache import response_cache
+from app.utils.serialization import dumps
 
 router = APIRouter(dependencies=[Depends(verify_admin_key)])
 
-@router.post("/simulate/day", response_model=SimulationResult)
-async def simulate_day():
+def job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {**job, "message": f"Day {job['day_index']} simulation {job['status']}"}
+
+def event_stream(job_id: str) -> StreamingResponse:
+    """Server-sent events for a job: `stage` transitions, `delta` LLM output chunks and `job` status."""
+    async def body():
+        async for name, payload in job_service.follow(job_id):
+            if name == "heartbeat":
+                # Keeps proxies from closing an idle connection during long LLM calls
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {name}\ndata: {dumps(payload).decode('utf-8')}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/simulate/day", response_model=SimulationJob, status_code=202)
+async def simulate_day(universe_id: str = Depends(get_universe_id)):
     """
-    Trigger the daily simulation pipeline.
+    Queue the daily simulation for one universe (?universe_id=, default universe otherwise)
+    and return its job right away. Submitting again for the same day returns the same job.
     Requires admin authentication via x-admin-key header.
     """
     try:
-        result = pipeline_service.run_daily_simulation()
-        logger.info(f"Simulation completed successfully for day {result['day_index']}")
-        return {
-            "day_index": result["day_index"],
-            "message": f"Day {result['day_index']} simulation completed successfully"
-        }
+        job = await job_service.submit(universe_id)
+    except Exception as e:
+        logger.error(f"Simulation submission failed: {str(e)}")
+        raise HTTPException(500, f"Simulation submission failed: {str(e)}")
+    logger.info(f"Simulation job {job['_id']} is {job['status']}")
+    return job_response(job)
+
+@router.post("/simulate/day/stream")
+async def simulate_day_stream(universe_id: str = Depends(get_universe_id)):
+    """
+    Queue the daily simulation like POST /simulate/day, then stream its progress
+    as server-sent events until the job finishes.
+    Requires admin authentication via x-admin-key header.
+    """
+    try:
+        job = await job_service.submit(universe_id)
+    except Exception as e:
+        logger.error(f"Simulation submission failed: {str(e)}")
+        raise HTTPException(500, f"Simulation submission failed: {str(e)}")
+    return event_stream(job["_id"])
+
+@router.post("/simulate/day/{day_index}/resume", response_model=SimulationJob, status_code=202)
+async def resume_day(day_index: int, universe_id: str = Depends(get_universe_id)):
+    """
+    Queue a partially failed day to resume from its last staged stage. The staged
+    subtopic and proposals are reused; only the missing stages call the LLMs.
+    Requires admin authentication via x-admin-key header.
+    """
+    checkpoint = await pipeline_service.load_checkpoint(universe_id, day_index)
+    if not checkpoint.started:
+        raise HTTPException(404, f"Day {day_index} has not been started")
+    if checkpoint.complete:
+        raise HTTPException(409, f"Day {day_index} is already complete")
+    try:
+        job = await job_service.submit(universe_id, day_index)
+    except Exception as e:
+        logger.error(f"Resume submission failed: {str(e)}")
+        raise HTTPException(500, f"Resume submission failed: {str(e)}")
+    logger.info(f"Resume job {job['_id']} is {job['status']}")
+    return job_response(job)
+
+@router.post("/simulate/universes", response_model=List[SimulationJob], status_code=202)
+async def simulate_universes(universe_ids: Optional[str] = None):
+    """
+    Queue one day for each of several universes; they run concurrently on the job worker.
+    `universe_ids` is comma-separated; defaults to UNIVERSE_IDS or every stored universe.
+    Requires admin authentication via x-admin-key header.
+    """
+    requested = [validate_universe_id(u.strip()) for u in universe_ids.split(",") if u.strip()] if universe_ids else None
+    try:
+        jobs = await job_service.submit_universes(requested)
+    except Exception as e:
+        logger.error(f"Simulation submission failed: {str(e)}")
+        raise HTTPException(500, f"Simulation submission failed: {str(e)}")
+    return [job_response(job) for job in jobs]
+
+@router.get("/jobs/{job_id}", response_model=SimulationJob)
+async def get_job(job_id: str):
+    """
+    Poll a simulation job's status, current stage and timings.
+    Requires admin authentication via x-admin-key header.
+    """
+    job = await job_service.get(job_id)
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return job_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """
+    Follow a job as server-sent events: recorded stage transitions first, then live
+    ones with streamed LLM output, until the job finishes.
+    Requires admin authentication via x-admin-key header.
+    """
+    if not await job_service.get(job_id):
+        raise HTTPException(404, f"Job {job_id} not found")
+    return event_stream(job_id)
+
+@router.post("/search/reindex")
+async def reindex_search(universe_id: str = Depends(get_universe_id)):
+    """
+    Build search documents for days simulated before search existed.
+    New days are indexed as they are committed.
+    Requires admin authentication via x-admin-key header.
+    """
+    try:
+        days = await reindex(universe_id)
     except Exception as e:
-        logger.error(f"Simulation failed: {str(e)}")
-        raise HTTPException(500, f"Simulation failed: {str(e)}")
+        logger.error(f"Search reindex failed: {str(e)}")
+        raise HTTPException(500, f"Search reindex failed: {str(e)}")
+    return {"universe_id": universe_id, "days_indexed": days}
 
 @router.post("/reset")
-async def reset_simulation():
+async def reset_simulation(universe_id: str = Depends(get_universe_id)):
     """
     Reset the entire simulation by clearing all data.
     WARNING: This is a destructive operation!
     Requires admin authentication via x-admin-key header.
     """
     try:
-        collections = ["timeline", "subtopics", "proposals", "judgements"]
+        collections = ["timeline", "subtopics", "proposals", "judgements", SEARCH_COLLECTION, STAGING_COLLECTION]
         for col in collections:
-            result = db.get_collection(col).delete_many({"universe_id": settings.UNIVERSE_ID})
+            result = await db.get_async_collection(col).delete_many({"universe_id": universe_id})
             logger.info(f"Deleted {result.deleted_count} documents from {col}")
+        # Finished jobs would otherwise be returned for the re-simulated days
+        await db.get_async_collection("simulation_jobs").delete_many({"universe_id": universe_id, "status": {"$nin": ACTIVE_STATUSES}})
+        pipeline_service.reset_subtopic_index(universe_id)
+        snapshot_service.remove(universe_id)
+        response_cache.invalidate(universe_id)
         
         return {
             "message": "Simulation reset successfully",
-            "universe_id": settings.UNIVERSE_ID
+            "universe_id": universe_id
         }
     except Exception as e:
         logger.error(f"Reset failed: {str(e)}")
@@ -1,58 +1,419 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+import base64
+import binascii
+import gzip
+import json
+import os
+import re
+import zlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Type
 from app.database import db
-from app.models import TimelineEvent, Subtopic, Proposal, Judgment
+from app.dependencies import get_universe_id
+from app.models import DayView, TimelineEvent, Subtopic, Proposal, Judgment, SearchResponse
 from app.config import settings
+from app.services.day_view import day_view
+from app.services.search import SEARCH_COLLECTION, SEARCH_KINDS, search
+from app.services.snapshots import SNAPSHOTS, snapshot_service
+from app.utils.response_cache import response_cache, etag_matches
+from app.utils.serialization import dumps
+from app.utils.metrics import metrics
+
+RESPONSE_CACHE_LOOKUPS = metrics.counter("response_cache_lookups_total", "Public response cache lookups", ["collection", "result"])
 
 router = APIRouter()
 
-# Cache the universe filter to avoid recreating it
-UNIVERSE_FILTER = {"universe_id": settings.UNIVERSE_ID}
+# Lean field sets for list views (?summary=true)
+SUMMARY_FIELDS = {
+    "timeline": ["day_index", "subtopic", "created_at", "event.title", "event.summary", "event.event_type", "event.date_in_universe"],
+    "subtopics": ["day_index", "selected_subtopic", "tags", "created_at"],
+    "proposals": ["day_index", "model", "subtopic", "title", "summary", "created_at"],
+    "judgements": ["day_index", "decision", "created_at"],
+}
+
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+class Projection:
+    """
+    Which stored fields a response exposes, pushed down into the Mongo query.
+    `fields` is None when every stored field is returned (models that allow extras).
+    """
+    def __init__(self, fields: Optional[List[str]]):
+        self.fields = fields
+
+    @property
+    def mongo(self) -> Optional[Dict[str, int]]:
+        if self.fields is None:
+            return None
+        # _id is always read for cursors and dropped again in shape()
+        return {"_id": 1, **{f: 1 for f in self.fields}}
+
+    def shape(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fields is None or "_id" in self.fields:
+            return doc
+        return {k: v for k, v in doc.items() if k != "_id"}
 
-def get_paginated(collection_name: str, skip: int, limit: int, sort_order: int = -1):
+def model_fields(model: Type[BaseModel]) -> Optional[List[str]]:
+    if model.model_config.get("extra") == "allow":
+        return None
+    return list(model.model_fields)
+
+def resolve_projection(collection_name: str, model: Type[BaseModel], fields: Optional[str] = None, summary: bool = False) -> Projection:
+    """Build the projection for a request from its `fields=` and `summary` parameters."""
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        allowed = model_fields(model)
+        for f in requested:
+            if not FIELD_RE.match(f) or (allowed is not None and f.split(".")[0] not in allowed):
+                raise HTTPException(400, f"Unknown field: {f}")
+        if "day_index" not in requested:
+            requested.insert(0, "day_index")
+        # Mongo rejects a path alongside its ancestor ("Path collision"); the ancestor already covers it
+        requested = list(dict.fromkeys(requested))
+        requested = [f for f in requested if not any(f.startswith(g + ".") for g in requested)]
+        return Projection(requested)
+    if summary:
+        return Projection(SUMMARY_FIELDS[collection_name])
+    return Projection(model_fields(model))
+
+async def get_paginated(universe_id: str, collection_name: str, skip: int, limit: int, sort_order: int = -1, projection: Optional[Dict[str, int]] = None):
     """Helper to get paginated results from a collection."""
-    cursor = db.get_collection(collection_name).find(
-        UNIVERSE_FILTER
-    ).sort("day_index", sort_order).skip(skip).limit(min(limit, 100))
-    return list(cursor)
+    return await db.get_async_collection(collection_name).find(
+        {"universe_id": universe_id},
+        projection=projection,
+        sort=[("day_index", sort_order), ("_id", sort_order)],
+        skip=skip,
+        limit=min(limit, 100)
+    )
+
+class Page(NamedTuple):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+def encode_cursor(doc: Dict[str, Any], order: int) -> str:
+    payload = json.dumps({"d": doc["day_index"], "i": doc["_id"], "o": order}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(data["d"], int) or data["o"] not in (1, -1):
+            raise ValueError
+        return data
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(400, "Invalid cursor")
+
+async def get_keyset_page(
+    universe_id: str,
+    collection_name: str,
+    limit: int,
+    before_day: Optional[int] = None,
+    after_day: Optional[int] = None,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, int]] = None
+) -> Page:
+    """
+    Cursor-based pagination on (day_index, _id), served from the
+    (universe_id, day_index) index so every page costs the same at any depth.
+    `before_day` pages newest-first, `after_day` pages oldest-first, and
+    `cursor` continues whichever direction produced it.
+    """
+    query: Dict[str, Any] = {"universe_id": universe_id}
+    if cursor:
+        position = decode_cursor(cursor)
+        order = position["o"]
+        op = "$lt" if order == -1 else "$gt"
+        # _id breaks ties between documents of the same day (e.g. proposals A and B)
+        query["$or"] = [
+            {"day_index": {op: position["d"]}},
+            {"day_index": position["d"], "_id": {op: position["i"]}}
+        ]
+    elif after_day is not None:
+        order = 1
+        query["day_index"] = {"$gt": after_day}
+    else:
+        order = -1
+        if before_day is not None:
+            query["day_index"] = {"$lt": before_day}
+
+    limit = min(limit, 100)
+    docs = await db.get_async_collection(collection_name).find(
+        query,
+        projection=projection,
+        sort=[("day_index", order), ("_id", order)],
+        limit=limit
+    )
+    next_cursor = encode_cursor(docs[-1], order) if len(docs) == limit else None
+    return Page(docs, next_cursor)
+
+async def cached_response(request: Request, universe_id: str, collection_name: str, loader: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Serve a JSON response from the response cache, loading it on a miss.
+    Responses carry a strong ETag so clients can revalidate with If-None-Match.
+    """
+    key = (universe_id, collection_name, request.url.path, str(request.query_params))
+    entry = response_cache.get(key)
+    RESPONSE_CACHE_LOOKUPS.inc(collection=collection_name, result="miss" if entry is None else "hit")
+    if entry is None:
+        generation = response_cache.generation(universe_id, collection_name)
+        data = await loader()
+        extra_headers = {}
+        if isinstance(data, Page):
+            if data.next_cursor:
+                extra_headers["X-Next-Cursor"] = data.next_cursor
+            data = data.items
+        body = dumps(data)
+        entry = response_cache.set(key, body, generation, extra_headers)
+
+    headers = {
+        **entry.headers,
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={settings.RESPONSE_CACHE_MAX_AGE}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+class PageParams:
+    """
+    Pagination query parameters shared by the list endpoints.
+    `skip` keeps working for existing clients; `before_day`, `after_day` or
+    `cursor` switch to keyset pagination. The cursor for the following page
+    is returned in the X-Next-Cursor header either way.
+    """
+    def __init__(
+        self,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        before_day: Optional[int] = Query(None),
+        after_day: Optional[int] = Query(None),
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. day_index,event.title"),
+        summary: bool = Query(False, description="Return a lean summary of each item")
+    ):
+        self.skip = skip
+        self.limit = limit
+        self.before_day = before_day
+        self.after_day = after_day
+        self.cursor = cursor
+        self.fields = fields
+        self.summary = summary
+
+    @property
+    def is_keyset(self) -> bool:
+        return self.cursor is not None or self.before_day is not None or self.after_day is not None
+
+async def load_page(universe_id: str, collection_name: str, model: Type[BaseModel], params: PageParams) -> Page:
+    """
+    Load a page of documents we wrote ourselves. They are shaped by the Mongo
+    projection and encoded directly rather than re-validated through the model.
+    """
+    projection = resolve_projection(collection_name, model, params.fields, params.summary)
+    if params.is_keyset:
+        page = await get_keyset_page(universe_id, collection_name, params.limit, params.before_day, params.after_day, params.cursor, projection.mongo)
+    else:
+        docs = await get_paginated(universe_id, collection_name, params.skip, params.limit, projection=projection.mongo)
+        page = Page(docs, encode_cursor(docs[-1], -1) if len(docs) == min(params.limit, 100) else None)
+    return Page([projection.shape(d) for d in page.items], page.next_cursor)
 
 @router.get("/timeline", response_model=List[TimelineEvent])
-async def get_timeline(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+async def get_timeline(request: Request, params: PageParams = Depends(), universe_id: str = Depends(get_universe_id)):
     """Get timeline events with pagination."""
-    return get_paginated("timeline", skip, limit)
+    return await cached_response(request, universe_id, "timeline", lambda: load_page(universe_id, "timeline", TimelineEvent, params))
 
 @router.get("/timeline/latest", response_model=TimelineEvent)
-async def get_latest_event():
+async def get_latest_event(request: Request, fields: Optional[str] = Query(None), universe_id: str = Depends(get_universe_id)):
     """Get the most recent timeline event."""
-    event = db.get_collection("timeline").find_one(
-        UNIVERSE_FILTER,
-        sort=[("day_index", -1)]
-    )
-    if not event:
-        raise HTTPException(404, "No events found")
-    return event
+    projection = resolve_projection("timeline", TimelineEvent, fields)
+    async def load():
+        event = await db.get_async_collection("timeline").find_one(
+            {"universe_id": universe_id},
+            projection.mongo,
+            sort=[("day_index", -1)]
+        )
+        if not event:
+            raise HTTPException(404, "No events found")
+        return projection.shape(event)
+    return await cached_response(request, universe_id, "timeline", load)
 
 @router.get("/timeline/{day_index}", response_model=TimelineEvent)
-async def get_event_by_day(day_index: int):
+async def get_event_by_day(request: Request, day_index: int, fields: Optional[str] = Query(None), universe_id: str = Depends(get_universe_id)):
     """Get a specific day's event."""
-    event = db.get_collection("timeline").find_one(
-        {**UNIVERSE_FILTER, "day_index": day_index}
-    )
-    if not event:
-        raise HTTPException(404, f"Event for day {day_index} not found")
-    return event
+    projection = resolve_projection("timeline", TimelineEvent, fields)
+    async def load():
+        event = await db.get_async_collection("timeline").find_one(
+            {"universe_id": universe_id, "day_index": day_index},
+            projection.mongo
+        )
+        if not event:
+            raise HTTPException(404, f"Event for day {day_index} not found")
+        return projection.shape(event)
+    return await cached_response(request, universe_id, "timeline", load)
+
+@router.get("/search", response_model=SearchResponse)
+async def search_universe(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=200, description="Words or \"quoted phrases\" to match; -word excludes"),
+    tags: Optional[str] = Query(None, description="Comma-separated tags that must all match"),
+    kinds: Optional[str] = Query(None, description="Comma-separated subset of timeline,subtopic,proposal"),
+    from_day: Optional[int] = Query(None, ge=1),
+    to_day: Optional[int] = Query(None, ge=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=50),
+    universe_id: str = Depends(get_universe_id)
+):
+    """Search the timeline, subtopics and proposals, ranked by relevance, with tag and kind facets."""
+    tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else None
+    kind_list = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    for kind in kind_list or []:
+        if kind not in SEARCH_KINDS:
+            raise HTTPException(400, f"Unknown kind: {kind}")
+    return await cached_response(request, universe_id, SEARCH_COLLECTION, lambda: search(
+        universe_id, (q or "").strip() or None, tag_list, kind_list, from_day, to_day, skip, limit
+    ))
+
+# Per-day documents joined onto each timeline entry by their deterministic _id suffixes
+DAY_PARTS = [("subtopics", "subtopic", "-subtopic"), ("proposals", "proposal_a", "-A-0"), ("proposals", "proposal_b", "-B-0"), ("judgements", "judgement", "-judgment")]
+
+async def load_days(universe_id: str, from_day: int, to_day: Optional[int], limit: int) -> List[Dict[str, Any]]:
+    """
+    Assemble whole days in one aggregation: timeline entries are read from the
+    (universe_id, day_index) index, and each day's subtopic, proposals and judgement
+    are joined on _id, which the pipeline derives from the day.
+    """
+    day_range: Dict[str, Any] = {"$gte": from_day}
+    if to_day is not None:
+        day_range["$lte"] = to_day
+    day_key = {"$concat": [f"{universe_id}-", {"$toString": "$day_index"}]}
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": {"universe_id": universe_id, "day_index": day_range}},
+        {"$sort": {"day_index": 1}},
+        {"$limit": limit},
+        {"$addFields": {f"_ref_{name}": {"$concat": [day_key, suffix]} for _, name, suffix in DAY_PARTS}},
+    ]
+    for collection, name, _ in DAY_PARTS:
+        pipeline.append({"$lookup": {"from": collection, "localField": f"_ref_{name}", "foreignField": "_id", "as": f"_{name}"}})
+    docs = await db.get_async_collection("timeline").aggregate(pipeline)
+
+    days = []
+    for doc in docs:
+        joined = {name: next(iter(doc[f"_{name}"]), None) for _, name, _ in DAY_PARTS}
+        days.append(day_view(doc["day_index"], doc, joined["subtopic"], (joined["proposal_a"], joined["proposal_b"]), joined["judgement"]))
+    return days
+
+@router.get("/days", response_model=List[DayView])
+async def get_days(
+    request: Request,
+    from_day: int = Query(1, ge=1, alias="from"),
+    to_day: Optional[int] = Query(None, ge=1, alias="to"),
+    limit: int = Query(20, ge=1, le=100),
+    universe_id: str = Depends(get_universe_id)
+):
+    """Whole days from `from` through `to` (at most `limit`), oldest first, in one round trip."""
+    return await cached_response(request, universe_id, "timeline", lambda: load_days(universe_id, from_day, to_day, limit))
+
+@router.get("/days/{day_index}", response_model=DayView)
+async def get_day(request: Request, day_index: int, universe_id: str = Depends(get_universe_id)):
+    """A day's accepted event with its subtopic, both proposals and the judgement."""
+    async def load():
+        days = await load_days(universe_id, day_index, day_index, 1)
+        if not days:
+            raise HTTPException(404, f"Day {day_index} not found")
+        return days[0]
+    # Days are committed together with their timeline entry, so timeline invalidation covers the whole view
+    return await cached_response(request, universe_id, "timeline", load)
 
 @router.get("/subtopics", response_model=List[Subtopic])
-async def get_subtopics(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+async def get_subtopics(request: Request, params: PageParams = Depends(), universe_id: str = Depends(get_universe_id)):
     """Get subtopics with pagination."""
-    return get_paginated("subtopics", skip, limit)
+    return await cached_response(request, universe_id, "subtopics", lambda: load_page(universe_id, "subtopics", Subtopic, params))
 
 @router.get("/proposals", response_model=List[Proposal])
-async def get_proposals(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+async def get_proposals(request: Request, params: PageParams = Depends(), universe_id: str = Depends(get_universe_id)):
     """Get proposals with pagination."""
-    return get_paginated("proposals", skip, limit)
+    return await cached_response(request, universe_id, "proposals", lambda: load_page(universe_id, "proposals", Proposal, params))
 
 @router.get("/judgements", response_model=List[Judgment])
-async def get_judgements(skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+async def get_judgements(request: Request, params: PageParams = Depends(), universe_id: str = Depends(get_universe_id)):
     """Get judgements with pagination."""
-    return get_paginated("judgements", skip, limit)
+    return await cached_response(request, universe_id, "judgements", lambda: load_page(universe_id, "judgements", Judgment, params))
+
+EXPORT_MODELS = {"timeline": TimelineEvent, "subtopics": Subtopic, "proposals": Proposal, "judgements": Judgment}
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+@router.get("/export/{collection_name}")
+async def export_collection(
+    collection_name: str,
+    compress: Optional[str] = Query(None, pattern="^gzip$", description="gzip for a compressed .ndjson.gz download"),
+    after_day: Optional[int] = Query(None, description="Only export days after this one"),
+    universe_id: str = Depends(get_universe_id)
+):
+    """
+    Stream a whole collection as NDJSON, oldest day first, from a single Mongo cursor.
+    Memory stays constant however long the history is.
+    """
+    model = EXPORT_MODELS.get(collection_name)
+    if model is None:
+        raise HTTPException(404, f"Unknown collection: {collection_name}")
+    projection = resolve_projection(collection_name, model)
+    query: Dict[str, Any] = {"universe_id": universe_id}
+    if after_day is not None:
+        query["day_index"] = {"$gt": after_day}
+
+    # The timeline has one entry per day; other collections break ties on the indexed _id
+    sort = [("day_index", 1)] if collection_name == "timeline" else [("day_index", 1), ("_id", 1)]
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for batch in db.get_async_collection(collection_name).iterate(
+            query,
+            projection.mongo,
+            sort=sort,
+            batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield b"".join(dumps(projection.shape(d)) + b"\n" for d in batch)
+
+    filename = f"{universe_id}-{collection_name}.ndjson"
+    if compress:
+        return StreamingResponse(
+            gzip_stream(lines()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'}
+        )
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def gunzip_file(path: str) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as f:
+        while chunk := f.read(64 * 1024):
+            yield chunk
+
+@router.get("/snapshots/{name}")
+async def get_snapshot(request: Request, name: str, universe_id: str = Depends(get_universe_id)):
+    """
+    Serve a pre-rendered snapshot with no database work: `timeline` (every event, oldest
+    first) or `latest` (the latest day's event, subtopic, proposals and judgement).
+    Sent gzip-encoded as written, or decompressed for clients that do not accept gzip.
+    """
+    try:
+        path = snapshot_service.path(universe_id, name) if name in SNAPSHOTS and snapshot_service.enabled else None
+    except ValueError:
+        path = None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(404, f"Snapshot {name} not found")
+    headers = {"Cache-Control": f"public, max-age={settings.RESPONSE_CACHE_MAX_AGE}", "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(path, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return StreamingResponse(gunzip_file(path), media_type="application/json", headers=headers)
@@ -0,0 +1,131 @@
+import json
+from functools import cached_property
+from typing import Any, Dict, List, Optional
+
+from app.utils.prompts import read_file
+from app.utils.logging import logger
+from app.utils.tokens import estimate_tokens
+
+SEED_FILE = "universe/universe_seed.json"
+
+# Event fields kept when an older event is degraded to a summary, then to a headline
+SUMMARY_EVENT_FIELDS = ["title", "summary", "event_type", "date_in_universe"]
+HEADLINE_EVENT_FIELDS = ["title", "date_in_universe"]
+
+def compact_json(obj: Any) -> str:
+    """JSON without the whitespace that pretty-printing spends tokens on."""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _degrade(event: Dict[str, Any], fields: List[str], keep_subtopic: bool) -> Dict[str, Any]:
+    slim = {"day_index": event.get("day_index")}
+    if keep_subtopic and "subtopic" in event:
+        slim["subtopic"] = event["subtopic"]
+    body = event.get("event")
+    if isinstance(body, dict):
+        slim["event"] = {k: body[k] for k in fields if k in body}
+    return slim
+
+
+def pack_timeline(events: List[Dict[str, Any]], budget_tokens: int) -> str:
+    """
+    Serialize cleaned timeline events (oldest first) within a token budget.
+    The newest events go in full; older ones are reduced to summaries, then
+    headlines, and the oldest are left out. Each tier may only fill the budget
+    up to its share, so a few long events cannot crowd out the rest of the
+    history, and an event is never given more detail than a newer one.
+    """
+    # (event fields or None for the full event, keep subtopic, share of the budget)
+    tiers = [(None, True, 0.6), (SUMMARY_EVENT_FIELDS, True, 0.85), (HEADLINE_EVENT_FIELDS, False, 1.0)]
+    tier = 0
+    packed: List[str] = []
+    used = 2
+    for event in reversed(events):
+        while tier < len(tiers):
+            fields, keep_subtopic, share = tiers[tier]
+            text = compact_json(event if fields is None else _degrade(event, fields, keep_subtopic))
+            cost = estimate_tokens(text) + 1
+            if used + cost <= budget_tokens * share:
+                break
+            tier += 1
+        if tier == len(tiers):
+            break
+        packed.append(text)
+        used += cost
+
+    if len(packed) < len(events) or tier:
+        logger.info(f"Packed {len(packed)}/{len(events)} timeline events into {used} of {budget_tokens} tokens")
+    return "[" + ",".join(reversed(packed)) + "]"
+
+
+def fit_document(doc: Dict[str, Any], budget_tokens: int) -> str:
+    """
+    Serialize one document within a token budget by shortening its longest
+    string values, so every field still reaches the prompt.
+    """
+    doc = json.loads(json.dumps(doc, default=str))
+    text = compact_json(doc)
+    for _ in range(64):
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+        # Find the longest string value and halve it
+        longest = None
+        stack = [doc]
+        while stack:
+            node = stack.pop()
+            items = node.items() if isinstance(node, dict) else enumerate(node)
+            for key, value in items:
+                if isinstance(value, str):
+                    if longest is None or len(value) > len(longest[0][longest[1]]):
+                        longest = (node, key)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        if longest is None or len(longest[0][longest[1]]) < 16:
+            break
+        container, key = longest
+        container[key] = container[key][:len(container[key]) // 2].rstrip() + "…"
+        text = compact_json(doc)
+    return text
+
+
+class PromptContext:
+    """
+    Snapshot of the data every stage prompt is built from.
+    Built once per simulation run and shared by all stages, so the seed and
+    recent timeline are read and serialized a single time per day.
+    """
+    def __init__(self, universe_id: str, universe_doc: Optional[Dict[str, Any]], recent_events: List[Dict[str, Any]]):
+        self.universe_id = universe_id
+        self.universe_doc = universe_doc
+        self.recent_events = recent_events
+        self._packed_timelines: Dict[int, str] = {}
+
+    @cached_property
+    def universe_seed_json(self) -> str:
+        if not self.universe_doc:
+            logger.warning("No universe document found in database, falling back to file")
+            return read_file(SEED_FILE)
+
+        # Remove MongoDB-specific fields
+        universe_copy = self.universe_doc.copy()
+        for key in ["_id", "created_at", "updated_at"]:
+            universe_copy.pop(key, None)
+
+        return compact_json(universe_copy)
+
+    @cached_property
+    def cleaned_events(self) -> List[Dict[str, Any]]:
+        cleaned = []
+        for e in self.recent_events:
+            e_copy = e.copy()
+            for key in ["_id", "created_at", "universe_id"]:
+                e_copy.pop(key, None)
+            cleaned.append(e_copy)
+        return cleaned
+
+    def timeline_json(self, budget_tokens: int) -> str:
+        """Recent timeline packed into a stage's token budget; computed once per budget."""
+        packed = self._packed_timelines.get(budget_tokens)
+        if packed is None:
+            packed = self._packed_timelines[budget_tokens] = pack_timeline(self.cleaned_events, budget_tokens)
+        return packed
@@ -0,0 +1,27 @@
+from typing import Any, Dict, Iterable, Optional
+
+from app.models import TimelineEvent
+
+# Internal fields the public API never returns
+HIDDEN_FIELDS = ("_id", "universe_id")
+
+
+def public_doc(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return {k: v for k, v in doc.items() if k not in HIDDEN_FIELDS} if doc else None
+
+
+def day_view(
+    day_index: int,
+    timeline: Optional[Dict[str, Any]],
+    subtopic: Optional[Dict[str, Any]],
+    proposals: Iterable[Optional[Dict[str, Any]]],
+    judgement: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """A whole day as served by /days and the `latest` snapshot (see models.DayView)."""
+    return {
+        "day_index": day_index,
+        "timeline": {k: timeline.get(k) for k in TimelineEvent.model_fields} if timeline else None,
+        "subtopic": public_doc(subtopic),
+        "proposals": [public_doc(p) for p in proposals if p],
+        "judgement": public_doc(judgement),
+    }
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple
+
+from app.config import settings
+
+# (SSE event name, payload)
+JobEvent = Tuple[str, Dict[str, Any]]
+
+
+class JobEventBus:
+    """
+    Fans live job events out to SSE subscribers.
+
+    Jobs run on the job worker's event loop while subscribers live on the
+    server's loop, so every event is handed over with call_soon_threadsafe.
+    Events are not persisted here: stage transitions are also recorded on the
+    job document, and token deltas are only ever delivered live.
+    """
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(job_id, []) if s[1] is not queue]
+            if subscribers:
+                self._subscribers[job_id] = subscribers
+            else:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, name: str, payload: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, []))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, (name, payload))
+            except RuntimeError:
+                # The subscriber's loop has closed; it unsubscribes on its way out
+                pass
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: JobEvent):
+        if queue.full():
+            # A slow client loses token deltas first; stage and job events must arrive
+            if event[0] == "delta":
+                return
+            pending = [queue.get_nowait() for _ in range(queue.qsize())]
+            delta = next((i for i, (name, _) in enumerate(pending) if name == "delta"), None)
+            if delta is not None:
+                del pending[delta]
+            for queued in pending:
+                queue.put_nowait(queued)
+            if delta is None:
+                return
+        queue.put_nowait(event)
+
+
+job_events = JobEventBus(queue_size=settings.SSE_QUEUE_SIZE)
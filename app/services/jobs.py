@@ -0,0 +1,336 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytz
+from pymongo import ReturnDocument
+
+from app.config import settings
+from app.database import StaleFenceError, db
+from app.services.events import JobEvent, job_events
+from app.services.leader import LeaseLost, scheduler_lease
+from app.services.llm_service import llm_service
+from app.services.pipeline import pipeline_service
+from app.utils.logging import logger
+
+ACTIVE_STATUSES = ["queued", "running"]
+FINISHED_STATUSES = ["succeeded", "failed"]
+
+
+def _now() -> datetime:
+    return datetime.now(pytz.timezone("Asia/Kolkata"))
+
+
+def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    fields = ["universe_id", "day_index", "status", "stage", "attempts", "error", "timings"]
+    return {"job_id": job["_id"], **{k: job.get(k) for k in fields}}
+
+
+class JobService:
+    """
+    In-process simulation job queue.
+
+    Jobs are recorded in the `simulation_jobs` collection and executed on a
+    dedicated worker thread with its own event loop, so a multi-minute run
+    never occupies a request worker. Job ids are `{universe_id}-{day_index}`,
+    which makes submissions idempotent per day.
+    """
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def start(self):
+        """Start the worker thread and its event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(settings.MAX_CONCURRENT_UNIVERSES)
+            self._loop.call_soon(ready.set)
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name="simulation-jobs", daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info("Simulation job worker started.")
+
+    def shutdown(self):
+        """Cancel outstanding jobs, close the LLM pool bound to the worker loop and stop it."""
+        if not self.running:
+            return
+
+        async def drain():
+            for task in list(self._tasks.values()):
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            await llm_service.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(drain(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.error(f"Error while draining simulation jobs: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        logger.info("Simulation job worker shut down.")
+
+    async def submit(self, universe_id: str, day_index: Optional[int] = None) -> Dict[str, Any]:
+        """Submit from any event loop; returns the (possibly pre-existing) job document."""
+        if not self.running:
+            raise RuntimeError("Simulation job worker is not running")
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._submit(universe_id, day_index), self._loop))
+
+    async def submit_universes(self, universe_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        universe_ids = universe_ids or await pipeline_service.list_universes()
+        return [await self.submit(u) for u in universe_ids]
+
+    def submit_universes_threadsafe(self, universe_ids: Optional[List[str]] = None, lease_token: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Submit from a non-async thread (the scheduler). Jobs given the scheduler's
+        `lease_token` stop at their next stage if the lease has passed to another process.
+        """
+        if not self.running:
+            raise RuntimeError("Simulation job worker is not running")
+
+        async def submit_all():
+            ids = universe_ids or await pipeline_service.list_universes()
+            return [await self._submit(u, None, lease_token) for u in ids]
+
+        return asyncio.run_coroutine_threadsafe(submit_all(), self._loop).result(timeout=60)
+
+    def adopt_orphans_threadsafe(self, lease_token: int) -> List[Dict[str, Any]]:
+        """
+        Take over every active job started under an older scheduler lease. Called by a newly
+        elected leader, so days its predecessor had in flight resume at once instead of
+        waiting for the next scheduled tick.
+        """
+        if not self.running:
+            raise RuntimeError("Simulation job worker is not running")
+
+        async def adopt_all():
+            orphans = await db.get_async_collection("simulation_jobs").find({
+                "status": {"$in": ACTIVE_STATUSES},
+                "lease_token": {"$ne": None, "$lt": lease_token}
+            })
+            return [await self._adopt(job, lease_token) for job in orphans]
+
+        return asyncio.run_coroutine_threadsafe(adopt_all(), self._loop).result(timeout=60)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await db.get_async_collection("simulation_jobs").find_one({"_id": job_id})
+
+    async def follow(self, job_id: str) -> AsyncIterator[JobEvent]:
+        """
+        Yield a job's recorded stage events, then live ones (including token
+        deltas) until it finishes. Between events a ("heartbeat", {}) is yielded
+        every SSE_HEARTBEAT_INTERVAL seconds, and the job document is re-read so
+        jobs running in another process are followed too, without deltas.
+        """
+        queue = job_events.subscribe(job_id)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            seen = len(job.get("events", []))
+            for event in job.get("events", []):
+                yield "stage", event
+            yield "job", _snapshot(job)
+            if job["status"] in FINISHED_STATUSES:
+                return
+
+            while True:
+                try:
+                    name, payload = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield "heartbeat", {}
+                    job = await self.get(job_id) or {}
+                    for event in job.get("events", [])[seen:]:
+                        yield "stage", event
+                    seen = max(seen, len(job.get("events", [])))
+                    if job.get("status") in FINISHED_STATUSES:
+                        yield "job", _snapshot(job)
+                        return
+                    continue
+
+                if name == "stage":
+                    # Already sent from the job document
+                    if payload["seq"] < seen:
+                        continue
+                    seen = payload["seq"] + 1
+                yield name, payload
+                if name == "job" and payload.get("status") in FINISHED_STATUSES:
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+
+    async def _submit(self, universe_id: str, day_index: Optional[int], lease_token: Optional[int] = None) -> Dict[str, Any]:
+        jobs = db.get_async_collection("simulation_jobs")
+        fresh_after = _now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+
+        # A live job for this universe already covers "simulate the next day"
+        if day_index is None:
+            active = await jobs.find_one({
+                "universe_id": universe_id,
+                "status": {"$in": ACTIVE_STATUSES},
+                "updated_at": {"$gte": fresh_after}
+            })
+            if active:
+                return await self._adopt(active, lease_token) if self._orphaned(active, lease_token) else active
+            day_index = await pipeline_service.get_next_day_index(universe_id)
+
+        job_id = f"{universe_id}-{day_index}"
+        now = _now()
+        job = {
+            "_id": job_id,
+            "universe_id": universe_id,
+            "day_index": day_index,
+            "status": "queued",
+            "stage": None,
+            "events": [],
+            "attempts": 0,
+            "lease_token": lease_token,
+            "created_at": now,
+            "updated_at": now
+        }
+        existing = await jobs.find_one_and_update(
+            {"_id": job_id},
+            {"$setOnInsert": {k: v for k, v in job.items() if k != "_id"}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        if existing is None:
+            self._schedule(job_id, universe_id, day_index, lease_token)
+            return job
+        if self._orphaned(existing, lease_token):
+            return await self._adopt(existing, lease_token)
+        if job_id in self._tasks:
+            return existing
+
+        # Failed, or abandoned by a process that died mid-run: retry the same day.
+        # The conditional update makes sure only one submitter revives it.
+        revived = await jobs.find_one_and_update(
+            {"_id": job_id, "$or": [
+                {"status": "failed"},
+                {"status": {"$in": ACTIVE_STATUSES}, "updated_at": {"$lt": fresh_after}}
+            ]},
+            {"$set": {"status": "queued", "stage": None, "error": None, "lease_token": lease_token, "updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if revived:
+            self._schedule(job_id, universe_id, day_index, lease_token)
+            return revived
+        return existing
+
+    @staticmethod
+    def _orphaned(job: Dict[str, Any], lease_token: Optional[int]) -> bool:
+        """Whether an active job belongs to a scheduler lease older than `lease_token`."""
+        owner = job.get("lease_token")
+        return (
+            lease_token is not None and owner is not None and owner < lease_token
+            and job.get("status") in ACTIVE_STATUSES
+        )
+
+    async def _adopt(self, job: Dict[str, Any], lease_token: int) -> Dict[str, Any]:
+        """Re-queue an orphaned job under `lease_token`; its old runner stops at its next fenced write."""
+        adopted = await db.get_async_collection("simulation_jobs").find_one_and_update(
+            {"_id": job["_id"], "lease_token": job.get("lease_token"), "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"status": "queued", "stage": None, "error": None, "lease_token": lease_token, "updated_at": _now()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if adopted is None:
+            return await self.get(job["_id"]) or job
+        logger.info(f"Adopted job {job['_id']} from scheduler lease {job.get('lease_token')}")
+        self._schedule(job["_id"], job["universe_id"], job["day_index"], lease_token)
+        return adopted
+
+    def _schedule(self, job_id: str, universe_id: str, day_index: int, lease_token: Optional[int] = None):
+        task = self._loop.create_task(self._run(job_id, universe_id, day_index, lease_token))
+        self._tasks[job_id] = task
+
+        def forget(done: asyncio.Task):
+            # An adopted job may already have a newer task under the same id
+            if self._tasks.get(job_id) is done:
+                del self._tasks[job_id]
+
+        task.add_done_callback(forget)
+
+    async def _set_status(self, job_id: str, lease_token: Optional[int], fields: Dict[str, Any], inc: Optional[Dict[str, int]] = None) -> bool:
+        """
+        Update a job's status fields and announce the change to live subscribers. Only applies
+        while the job still belongs to `lease_token`; returns False once it has been adopted.
+        """
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": _now()}}
+        if inc:
+            update["$inc"] = inc
+        result = await db.get_async_collection("simulation_jobs").update_one({"_id": job_id, "lease_token": lease_token}, update)
+        if result.matched_count == 0:
+            return False
+        job_events.publish(job_id, "job", {"job_id": job_id, **fields})
+        return True
+
+    async def _run(self, job_id: str, universe_id: str, day_index: int, lease_token: Optional[int] = None):
+        jobs = db.get_async_collection("simulation_jobs")
+        async with self._slots:
+            if not await self._set_status(job_id, lease_token, {"status": "running", "started_at": _now()}, inc={"attempts": 1}):
+                return  # Adopted by a newer leader while queued
+            # Stage events are numbered across attempts so followers can skip ones they have seen
+            job = await jobs.find_one({"_id": job_id}, {"events": 1})
+            seq = len(job.get("events", [])) if job else 0
+
+            async def progress(event: Dict[str, Any]):
+                nonlocal seq
+                # Token deltas are only streamed live; stage transitions are also recorded
+                if event["status"] == "delta":
+                    job_events.publish(job_id, "delta", event)
+                    return
+                # Fencing: a scheduled job stops before its next LLM stage, or the commit, once its lease is gone
+                if lease_token is not None and not await scheduler_lease.aholds(lease_token):
+                    raise LeaseLost(f"Scheduler lease {lease_token} is no longer held by this process")
+                event = {**event, "seq": seq, "at": _now()}
+                seq += 1
+                pushed = await jobs.update_one(
+                    {"_id": job_id, "lease_token": lease_token},
+                    {"$set": {"stage": event["stage"], "updated_at": _now()}, "$push": {"events": event}}
+                )
+                if pushed.matched_count == 0:
+                    raise StaleFenceError(f"Job {job_id} was adopted by a newer scheduler lease")
+                job_events.publish(job_id, "stage", event)
+
+            # The commit itself is conditional on the lease, not only the check before it
+            fence = (lambda: scheduler_lease.fence(lease_token)) if lease_token is not None else None
+            try:
+                result = await pipeline_service.run_daily_simulation(universe_id, day_index, progress, fence)
+                await self._set_status(job_id, lease_token, {
+                    "status": "succeeded",
+                    "stage": None,
+                    "timings": result["timings"],
+                    "finished_at": _now()
+                })
+                logger.info(f"Job {job_id} succeeded.")
+            except asyncio.CancelledError:
+                if lease_token is not None:
+                    # Left queued under our token, so whichever process leads next adopts it
+                    await self._set_status(job_id, lease_token, {"status": "queued", "stage": None, "error": "Cancelled on shutdown"})
+                else:
+                    await self._set_status(job_id, lease_token, {"status": "failed", "error": "Cancelled on shutdown", "finished_at": _now()})
+                raise
+            except StaleFenceError as e:
+                # Nothing was committed; the new leader resumes the day from its checkpoint
+                logger.warning(f"Job {job_id} stopped: {e}")
+                await self._set_status(job_id, lease_token, {"status": "queued", "stage": None, "error": str(e)})
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                await self._set_status(job_id, lease_token, {"status": "failed", "error": str(e), "finished_at": _now()})
+
+
+job_service = JobService()
@@ -0,0 +1,186 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import pytz
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.config import settings
+from app.database import Fence, StaleFenceError, db
+from app.utils.logging import logger
+from app.utils.metrics import metrics
+
+LEASES_COLLECTION = "leases"
+
+IS_LEADER = metrics.gauge("leader_lease_held", "1 while this process holds the lease", ["lease"])
+LEADER_CHANGES = metrics.counter("leader_lease_transitions_total", "Times this process gained or lost the lease", ["lease", "transition"])
+
+
+class LeaseLost(StaleFenceError):
+    """Raised when work fenced by a lease token finds the lease held by someone else."""
+
+
+def _now() -> datetime:
+    return datetime.now(pytz.utc)
+
+
+class LeaderElection:
+    """
+    Mongo-backed lease that elects one process among all workers and dynos.
+
+    The lease is a document in `leases` naming its holder and an expiry. Every
+    process runs a heartbeat thread: the holder extends the expiry every
+    LEASE_RENEW_INTERVAL seconds, the others take the lease over once it has
+    expired. Each takeover increments the lease's `token`, a fencing token:
+    work started under a lease carries its token, checks `holds(token)` before
+    each step and makes its commit conditional on `fence(token)`, so a leader
+    that stalled past its expiry cannot write after a successor has been
+    elected. Expiry is judged by each process's clock, so LEASE_TTL must
+    comfortably exceed clock skew between hosts.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.holder_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.token: Optional[int] = None
+        self.expires_at: Optional[datetime] = None
+        self._on_elected: Optional[Callable[[], None]] = None
+        self._on_demoted: Optional[Callable[[], None]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def collection(self):
+        return db.get_collection(LEASES_COLLECTION)
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process believes it holds the lease; `holds()` asks Mongo."""
+        return self.token is not None and self.expires_at is not None and _now() < self.expires_at
+
+    def start(self, on_elected: Callable[[], None], on_demoted: Callable[[], None]):
+        """Start the heartbeat thread; the callbacks run on it when leadership changes."""
+        if self._thread is not None:
+            return
+        self._on_elected, self._on_demoted = on_elected, on_demoted
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Campaigning for the {self.name} lease as {self.holder_id}")
+
+    def stop(self):
+        """Stop heartbeating and release the lease so another process can take over at once."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=settings.LEASE_RENEW_INTERVAL + 5)
+        self._thread = None
+        if self.token is not None:
+            try:
+                self.collection.update_one(
+                    {"_id": self.name, "holder": self.holder_id, "token": self.token},
+                    {"$set": {"expires_at": _now()}}
+                )
+                logger.info(f"Released the {self.name} lease")
+            except PyMongoError as e:
+                logger.error(f"Failed to release the {self.name} lease: {e}")
+            self._demote()
+
+    def holds(self, token: Optional[int]) -> bool:
+        """Fencing check: whether `token` is still the current, unexpired lease and it is ours."""
+        if token is None:
+            return False
+        return self.collection.find_one(self.fence(token)[1], {"_id": 1}) is not None
+
+    async def aholds(self, token: Optional[int]) -> bool:
+        if token is None:
+            return False
+        return await db.get_async_collection(LEASES_COLLECTION).find_one(self.fence(token)[1], {"_id": 1}) is not None
+
+    def fence(self, token: int) -> Fence:
+        """The lease document as it must still be for work under `token` to write; see Database.bulk_upsert."""
+        return LEASES_COLLECTION, {"_id": self.name, "holder": self.holder_id, "token": token, "expires_at": {"$gt": _now()}}
+
+    async def status(self) -> Dict[str, Any]:
+        lease = await db.get_async_collection(LEASES_COLLECTION).find_one({"_id": self.name}) or {}
+        return {
+            "lease": self.name,
+            "instance": self.holder_id,
+            "is_leader": self.is_leader,
+            "holder": lease.get("holder"),
+            "token": lease.get("token"),
+            "expires_at": lease.get("expires_at"),
+        }
+
+    def _heartbeat(self):
+        while True:
+            self._tick()
+            if self._stop.wait(settings.LEASE_RENEW_INTERVAL):
+                return
+
+    def _tick(self):
+        was_leader = self.token is not None
+        # Taken before the write, so we never believe in the lease longer than Mongo does
+        expiry = _now() + timedelta(seconds=settings.LEASE_TTL)
+        try:
+            lease = self._renew(expiry) if was_leader else self._acquire(expiry)
+        except PyMongoError as e:
+            # Keep acting on a lease we hold until it would expire anyway; nobody can take it before then
+            logger.error(f"Lease {self.name} heartbeat failed: {e}")
+            if was_leader and not self.is_leader:
+                self._demote()
+            return
+
+        if lease is None:
+            if was_leader:
+                self._demote()
+            return
+        self.expires_at = expiry
+        if not was_leader:
+            self.token = lease["token"]
+            IS_LEADER.set(1, lease=self.name)
+            LEADER_CHANGES.inc(lease=self.name, transition="elected")
+            logger.info(f"Acquired the {self.name} lease (token {self.token})")
+            self._callback(self._on_elected)
+
+    def _acquire(self, expiry: datetime) -> Optional[Dict[str, Any]]:
+        try:
+            # Matches a missing or expired lease; a live one makes the upsert collide on _id
+            return self.collection.find_one_and_update(
+                {"_id": self.name, "expires_at": {"$lte": _now()}},
+                {"$set": {"holder": self.holder_id, "expires_at": expiry, "acquired_at": _now()}, "$inc": {"token": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None
+
+    def _renew(self, expiry: datetime) -> Optional[Dict[str, Any]]:
+        # Conditional on our token, so a lease taken over while we stalled is never extended
+        return self.collection.find_one_and_update(
+            {"_id": self.name, "holder": self.holder_id, "token": self.token},
+            {"$set": {"expires_at": expiry}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _demote(self):
+        self.token = None
+        self.expires_at = None
+        IS_LEADER.set(0, lease=self.name)
+        LEADER_CHANGES.inc(lease=self.name, transition="demoted")
+        logger.warning(f"Lost the {self.name} lease")
+        self._callback(self._on_demoted)
+
+    def _callback(self, fn: Optional[Callable[[], None]]):
+        if fn is None:
+            return
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Lease {self.name} callback failed: {e}")
+
+
+scheduler_lease = LeaderElection("scheduler")
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils.logging import logger
+
+CACHE_MODES = ("off", "read_write", "record", "replay")
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in replay mode when a prompt was never recorded."""
+
+
+def cache_key(provider: str, model: str, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{provider}\0{model}\0{prompt_hash}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed store of accepted LLM completions on local disk.
+
+    Entries are keyed by provider, model name and a hash of the prompt, one JSON
+    file per entry. When the directory grows past `max_bytes` the least recently
+    used entries are removed. Modes:
+      off        - always call the provider
+      read_write - serve hits, record misses
+      record     - always call the provider and record the answer
+      replay     - serve only recorded answers; a miss raises LLMCacheMiss
+    """
+    def __init__(self, directory: str, mode: str, max_bytes: int):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"LLM_CACHE_MODE must be one of {CACHE_MODES}, got '{mode}'")
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def reads(self) -> bool:
+        return self.mode in ("read_write", "replay")
+
+    @property
+    def writes(self) -> bool:
+        return self.mode in ("read_write", "record")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # mtime doubles as last use for LRU eviction
+        os.utime(path)
+        return entry["response"]
+
+    def _write(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its budget."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._size = total
+        logger.info(f"LLM cache evicted {removed} entries ({total} bytes kept)")
+
+    async def get(self, provider: str, model: str, prompt: str) -> Optional[str]:
+        if not self.reads:
+            return None
+        response = await asyncio.to_thread(self._read, cache_key(provider, model, prompt))
+        if response is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No recorded {provider}/{model} response for this prompt")
+            return None
+        self.hits += 1
+        return response
+
+    async def put(self, provider: str, model: str, prompt: str, response: str):
+        if not self.writes:
+            return
+        entry = {
+            "provider": provider,
+            "model": model,
+            "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "response": response,
+            "recorded_at": time.time(),
+        }
+        try:
+            await asyncio.to_thread(self._write, cache_key(provider, model, prompt), entry)
+        except OSError as e:
+            # Losing a cache entry must never fail the call that produced it
+            logger.warning(f"Could not record LLM response: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "bytes": self._size}
+
+
+llm_cache = LLMResponseCache(
+    directory=settings.LLM_CACHE_DIR,
+    mode=settings.LLM_CACHE_MODE,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES
+)
@@ -0,0 +1,262 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.llm_cache import LLMCacheMiss
+from app.services.llm_service import llm_service
+from app.utils.logging import logger
+from app.utils.metrics import metrics
+
+# Turns a raw completion into the stage's result; raising marks the answer as bad
+ResponseParser = Callable[[str], Any]
+# Receives (provider, chunk) while providers stream; hedged calls stream side by side
+ProviderDeltaCallback = Callable[[str, str], Awaitable[None]]
+
+LLM_RETRIES = metrics.counter("llm_retries_total", "Repeated passes over a stage's provider chain", ["stage"])
+LLM_FAILOVERS = metrics.counter("llm_failovers_total", "Hand-overs to the next provider after a failure", ["stage"])
+LLM_HEDGES = metrics.counter("llm_hedged_requests_total", "Hedged requests sent because a provider was slow", ["stage"])
+LLM_STAGE_FAILURES = metrics.counter("llm_stage_failures_total", "Stages that failed after every attempt", ["stage"])
+LLM_PARSE_FAILURES = metrics.counter("llm_json_parse_failures_total", "Responses that could not be parsed into the stage's JSON", ["provider"])
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. After `failure_threshold` consecutive failures the
+    provider is skipped for `reset_timeout` seconds, then a single probe call
+    decides whether it is closed again or stays open.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def available(self) -> bool:
+        """Whether a call could be let through right now, without claiming the probe slot."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def allow(self) -> bool:
+        """Claim permission for one call; in the half-open state only one probe gets through."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """Give back a half-open probe slot that ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies for one provider."""
+    def __init__(self, window: int = 100):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class LLMRouter:
+    """
+    Routes each pipeline stage over an ordered chain of providers.
+
+    Within an attempt the chain is walked in order: a provider that fails hands
+    over to the next one at once, and one that runs past its usual latency
+    (LLM_HEDGE_PERCENTILE of its recent calls) gets a hedged request to the next
+    provider alongside it. The first answer that parses wins and the rest are
+    cancelled. Providers with an open circuit breaker are skipped, and whole
+    attempts are retried with exponential backoff and full jitter.
+    """
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+
+    def chain(self, stage: str) -> List[str]:
+        chains = {
+            "subtopic": settings.SUBTOPIC_PROVIDERS,
+            "model_a": settings.MODEL_A_PROVIDERS,
+            "model_b": settings.MODEL_B_PROVIDERS,
+            "judge": settings.JUDGE_PROVIDERS,
+        }
+        if stage not in chains:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        return [p.strip() for p in chains[stage].split(",") if p.strip()]
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(
+                settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                settings.LLM_CIRCUIT_RESET_TIMEOUT
+            )
+        return breaker
+
+    def latency(self, provider: str) -> LatencyTracker:
+        tracker = self._latencies.get(provider)
+        if tracker is None:
+            tracker = self._latencies[provider] = LatencyTracker()
+        return tracker
+
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Seconds to wait on `provider` before hedging, or None until enough calls have been seen."""
+        if not settings.LLM_HEDGING:
+            return None
+        tracker = self.latency(provider)
+        if len(tracker) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(tracker.percentile(settings.LLM_HEDGE_PERCENTILE), settings.LLM_HEDGE_MIN_DELAY)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        providers = set(self._breakers) | set(self._latencies)
+        return {
+            p: {
+                "circuit": self.breaker(p).state,
+                "consecutive_failures": self.breaker(p).failures,
+                "p50_seconds": self.latency(p).percentile(0.5),
+                "hedge_after_seconds": self.hedge_delay(p),
+            }
+            for p in sorted(providers)
+        }
+
+    async def complete(self, stage: str, prompt: str, parse: ResponseParser, on_delta: Optional[ProviderDeltaCallback] = None) -> Tuple[str, Any]:
+        """Return (provider, parsed result) for a stage, or raise once every attempt has failed."""
+        chain = self.chain(stage)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(settings.LLM_MAX_ATTEMPTS):
+            if attempt:
+                LLM_RETRIES.inc(stage=stage)
+                # Full jitter keeps concurrent universes from retrying in lockstep
+                backoff = min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, backoff))
+
+            candidates = [p for p in chain if self.breaker(p).available]
+            if not candidates:
+                last_error = RuntimeError(f"All providers for {stage} have open circuits: {chain}")
+                logger.warning(f"[{stage}] Attempt {attempt+1}: {last_error}")
+                continue
+            try:
+                return await self._race(stage, candidates, prompt, parse, on_delta)
+            except Exception as e:
+                last_error = e
+                logger.error(f"[{stage}] Attempt {attempt+1} failed: {e}")
+
+        LLM_STAGE_FAILURES.inc(stage=stage)
+        raise RuntimeError(f"{stage} failed after {settings.LLM_MAX_ATTEMPTS} attempts: {last_error}")
+
+    async def _call(self, provider: str, prompt: str, parse: ResponseParser, on_delta: Optional[ProviderDeltaCallback]) -> Any:
+        breaker = self.breaker(provider)
+        started = time.perf_counter()
+
+        async def forward(text: str):
+            await on_delta(provider, text)
+
+        cached = False
+        try:
+            text, cached = await llm_service.generate(provider, prompt, forward if on_delta else None)
+            try:
+                result = parse(text)
+            except Exception:
+                LLM_PARSE_FAILURES.inc(provider=provider)
+                raise
+        except (asyncio.CancelledError, LLMCacheMiss):
+            # A prompt missing from a replay says nothing about the provider's health
+            breaker.release()
+            raise
+        except Exception:
+            if cached:
+                breaker.release()
+            else:
+                breaker.record_failure()
+            raise
+        if cached:
+            # Recorded answers never reached the provider; they would skew its health and hedge latency
+            breaker.release()
+            return result
+        await llm_service.remember(provider, prompt, text)
+        breaker.record_success()
+        self.latency(provider).record(time.perf_counter() - started)
+        return result
+
+    async def _race(self, stage: str, candidates: List[str], prompt: str, parse: ResponseParser, on_delta: Optional[ProviderDeltaCallback]) -> Tuple[str, Any]:
+        queue = list(candidates)
+        running: Dict[asyncio.Task, str] = {}
+        errors: List[str] = []
+        hedge_at: Optional[float] = None
+
+        def launch():
+            nonlocal hedge_at
+            hedge_at = None
+            while queue:
+                provider = queue.pop(0)
+                if not self.breaker(provider).allow():
+                    continue
+                running[asyncio.create_task(self._call(provider, prompt, parse, on_delta))] = provider
+                delay = self.hedge_delay(provider) if queue else None
+                hedge_at = time.monotonic() + delay if delay is not None else None
+                return
+
+        launch()
+        try:
+            while running:
+                timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"[{stage}] {list(running.values())[-1]} is slow, hedging with {queue[0]}")
+                    LLM_HEDGES.inc(stage=stage)
+                    launch()
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        return provider, task.result()
+                    errors.append(f"{provider}: {task.exception()}")
+                    logger.warning(f"[{stage}] {provider} failed: {task.exception()}")
+                    if queue:
+                        LLM_FAILOVERS.inc(stage=stage)
+                        launch()
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise RuntimeError("; ".join(errors))
+
+
+llm_router = LLMRouter()
@@ -1,58 +1,266 @@
-from openai import OpenAI
-import google.generativeai as genai
-from groq import Groq
+import inspect
+import time
+import httpx
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 from app.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.rate_limiter import ProviderLimiter, parse_limits, retry_after
 from app.utils.logging import logger
+from app.utils.metrics import metrics, SIZE_BUCKETS
+from app.utils.tokens import estimate_tokens
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Model behind each provider name; part of the LLM cache key
+PROVIDER_MODELS = {
+    "qwen": "x-ai/grok-4.1-fast:free",
+    "gemini": "gemini-flash-latest",
+    "deepseek": "tngtech/deepseek-r1t-chimera:free",
+    "groq": "llama-3.3-70b-versatile",
+}
+
+# Receives each chunk of a streamed completion as it arrives
+DeltaCallback = Callable[[str], Awaitable[None]]
+# handler(prompt) or handler(prompt, on_delta) -> full completion text
+ProviderHandler = Callable[..., Awaitable[str]]
+
+LLM_SECONDS = metrics.histogram("llm_request_duration_seconds", "Provider call latency, excluding cache hits", ["provider"])
+LLM_REQUESTS = metrics.counter("llm_requests_total", "Provider calls by outcome (success, error, cache_hit)", ["provider", "outcome"])
+LLM_PROMPT_CHARS = metrics.histogram("llm_prompt_chars", "Prompt size in characters", ["provider"], SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = metrics.histogram("llm_response_chars", "Response size in characters", ["provider"], SIZE_BUCKETS)
+LLM_TOKENS = metrics.counter("llm_tokens_estimated_total", "Estimated tokens sent (prompt) and received (response)", ["provider", "direction"])
+LLM_FIRST_TOKEN_SECONDS = metrics.histogram("llm_time_to_first_token_seconds", "Time until a streaming provider sends its first chunk", ["provider"])
 
 class LLMService:
+    """
+    Async provider layer. All OpenAI-compatible clients share one pooled
+    keep-alive HTTP client, so concurrent calls reuse connections and never
+    block the event loop. Every call is a plain coroutine and can be cancelled.
+
+    Provider SDKs are imported and their clients built on first use, so
+    processes that never call a provider (public-only replicas) never load them.
+    """
     def __init__(self):
-        self.qwen_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1", 
-            api_key=settings.QWEN_API_KEY or "dummy-key"
-        )
-        self.deepseek_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1", 
-            api_key=settings.OPENROUTER_API_KEY or "dummy-key"
-        )
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY or "dummy-key")
-        
-        if settings.GEMINI_KEY:
-            genai.configure(api_key=settings.GEMINI_KEY)
-            self.gemini_model = genai.GenerativeModel("gemini-flash-latest")
-        else:
+        self.timeout = httpx.Timeout(settings.LLM_REQUEST_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[str, Any] = {}
+        if not settings.GEMINI_KEY:
             logger.warning("Gemini Key missing. Model A will fail.")
-            self.gemini_model = None
 
-    def generate_qwen(self, prompt: str) -> str:
-        completion = self.qwen_client.chat.completions.create(
-            model="x-ai/grok-4.1-fast:free",
-            messages=[{"role": "user", "content": prompt}],
-            stream=False
+        self._providers: Dict[str, ProviderHandler] = {
+            "qwen": self.agenerate_qwen,
+            "gemini": self.agenerate_gemini,
+            "deepseek": self.agenerate_deepseek,
+            "groq": self.agenerate_groq,
+        }
+        # Shared by every universe and stage, so parallel runs stay inside each provider's free-tier limits
+        self._limiters: Dict[str, ProviderLimiter] = {}
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._http_client
+
+    def client(self, provider: str) -> Any:
+        """The SDK client for a provider, importing the SDK and creating the client on first use."""
+        client = self._clients.get(provider)
+        if client is None:
+            started = time.perf_counter()
+            client = self._clients[provider] = self._create_client(provider)
+            logger.info(f"Initialized {provider} client in {time.perf_counter() - started:.2f}s")
+        return client
+
+    def _create_client(self, provider: str) -> Any:
+        if provider in ("qwen", "deepseek"):
+            from openai import AsyncOpenAI
+            api_key = settings.QWEN_API_KEY if provider == "qwen" else settings.OPENROUTER_API_KEY
+            return AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=api_key or "dummy-key",
+                http_client=self.http_client,
+                timeout=self.timeout,
+                # 429s surface to the rate limiter, which pauses the provider for every caller
+                max_retries=0
+            )
+        if provider == "groq":
+            from groq import AsyncGroq
+            return AsyncGroq(
+                api_key=settings.GROQ_API_KEY or "dummy-key",
+                http_client=self.http_client,
+                timeout=self.timeout,
+                max_retries=0
+            )
+        if provider == "gemini":
+            if not settings.GEMINI_KEY:
+                raise ValueError("Gemini model not configured")
+            import google.generativeai as genai
+            genai.configure(api_key=settings.GEMINI_KEY)
+            return genai.GenerativeModel(PROVIDER_MODELS["gemini"])
+        raise ValueError(f"No built-in client for provider: {provider}")
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        """The rate limiter of a provider; limits are looked up by provider name, then model."""
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            model = PROVIDER_MODELS.get(provider, provider)
+
+            def limit(spec: str, default: float = 0) -> float:
+                limits = parse_limits(spec)
+                return limits.get(provider, limits.get(model, default))
+
+            limiter = self._limiters[provider] = ProviderLimiter(
+                provider,
+                rpm=limit(settings.LLM_RPM),
+                tpm=limit(settings.LLM_TPM),
+                max_in_flight=int(limit(settings.LLM_MAX_IN_FLIGHT, settings.LLM_PROVIDER_MAX_IN_FLIGHT))
+            )
+        return limiter
+
+    def limits_status(self) -> Dict[str, Dict[str, Any]]:
+        return {p: limiter.status() for p, limiter in sorted(self._limiters.items())}
+
+    def register_provider(self, name: str, handler: ProviderHandler):
+        """
+        Register or replace the coroutine used for a provider name. Handlers that
+        accept an `on_delta` argument are streamed; others are awaited whole.
+        """
+        self._providers[name] = handler
+
+    def _streams(self, handler: ProviderHandler) -> bool:
+        try:
+            return "on_delta" in inspect.signature(handler).parameters
+        except (TypeError, ValueError):
+            return False
+
+    async def generate(self, provider: str, prompt: str, on_delta: Optional[DeltaCallback] = None) -> Tuple[str, bool]:
+        """
+        Complete `prompt` with a provider; returns (text, whether it was served from the LLM cache).
+        Streaming providers pass each chunk to `on_delta` as it arrives; a cached answer is
+        delivered as a single chunk. Fresh answers are not cached here: the caller records them
+        with `remember` once they have parsed, so a malformed answer is never replayed.
+        """
+        handler = self._providers.get(provider)
+        if handler is None:
+            raise ValueError(f"Unknown LLM provider: {provider}")
+        model = PROVIDER_MODELS.get(provider, provider)
+        cached = await llm_cache.get(provider, model, prompt)
+        if cached is not None:
+            LLM_REQUESTS.inc(provider=provider, outcome="cache_hit")
+            if on_delta:
+                await on_delta(cached)
+            return cached, True
+
+        prompt_tokens = estimate_tokens(prompt)
+        LLM_PROMPT_CHARS.observe(len(prompt), provider=provider)
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, direction="prompt")
+        limiter = self.limiter(provider)
+        async with limiter.slot(prompt_tokens):
+            started = time.perf_counter()
+            first_chunk = True
+
+            async def forward(text: str):
+                nonlocal first_chunk
+                if first_chunk:
+                    first_chunk = False
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, provider=provider)
+                if on_delta:
+                    await on_delta(text)
+
+            try:
+                response = await (handler(prompt, on_delta=forward) if self._streams(handler) else handler(prompt))
+            except Exception as e:
+                LLM_REQUESTS.inc(provider=provider, outcome="error")
+                pause = retry_after(e)
+                if pause is not None:
+                    logger.warning(f"{provider} is rate limited; pausing its queue for {pause:.1f}s")
+                    limiter.pause(pause)
+                raise
+            finally:
+                LLM_SECONDS.observe(time.perf_counter() - started, provider=provider)
+        response_tokens = estimate_tokens(response or "")
+        limiter.consume(response_tokens)
+        LLM_REQUESTS.inc(provider=provider, outcome="success")
+        LLM_RESPONSE_CHARS.observe(len(response or ""), provider=provider)
+        LLM_TOKENS.inc(response_tokens, provider=provider, direction="response")
+        return response, False
+
+    async def remember(self, provider: str, prompt: str, response: str):
+        """Record an accepted answer in the LLM cache."""
+        await llm_cache.put(provider, PROVIDER_MODELS.get(provider, provider), prompt, response)
+
+    async def _stream_chat(self, client, on_delta: Optional[DeltaCallback], **kwargs) -> str:
+        """Run an OpenAI-compatible chat completion in streaming mode and return the full text."""
+        stream = await client.chat.completions.create(stream=True, **kwargs)
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                if on_delta:
+                    await on_delta(text)
+        return "".join(parts)
+
+    async def agenerate_qwen(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        return await self._stream_chat(
+            self.client("qwen"),
+            on_delta,
+            model=PROVIDER_MODELS["qwen"],
+            messages=[{"role": "user", "content": prompt}]
         )
-        return completion.choices[0].message.content
 
-    def generate_gemini(self, prompt: str) -> str:
-        if not self.gemini_model:
-            raise ValueError("Gemini model not configured")
-        response = self.gemini_model.generate_content(prompt)
-        return response.text
+    async def agenerate_gemini(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        response = await self.client("gemini").generate_content_async(
+            prompt,
+            stream=True,
+            request_options={"timeout": settings.LLM_REQUEST_TIMEOUT}
+        )
+        parts = []
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only safety metadata)
+                continue
+            if text:
+                parts.append(text)
+                if on_delta:
+                    await on_delta(text)
+        return "".join(parts)
 
-    def generate_deepseek(self, prompt: str) -> str:
-        completion = self.deepseek_client.chat.completions.create(
+    async def agenerate_deepseek(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        return await self._stream_chat(
+            self.client("deepseek"),
+            on_delta,
             extra_headers={"HTTP-Referer": "https://localhost", "X-Title": "Alternate History Engine"},
-            model="tngtech/deepseek-r1t-chimera:free",
-            messages=[{"role": "user", "content": prompt}],
-            stream=False
+            model=PROVIDER_MODELS["deepseek"],
+            messages=[{"role": "user", "content": prompt}]
         )
-        return completion.choices[0].message.content
 
-    def generate_groq(self, prompt: str) -> str:
-        completion = self.groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+    async def agenerate_groq(self, prompt: str, on_delta: Optional[DeltaCallback] = None) -> str:
+        return await self._stream_chat(
+            self.client("groq"),
+            on_delta,
+            model=PROVIDER_MODELS["groq"],
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            stream=False
+            temperature=0.7
         )
-        return completion.choices[0].message.content
+
+    async def aclose(self):
+        if self._http_client is None:
+            return
+        await self._http_client.aclose()
+        self._http_client = None
+        self._clients.clear()
+        logger.info("LLM HTTP connection pool closed.")
 
 llm_service = LLMService()
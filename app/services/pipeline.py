@@ -1,232 +1,511 @@
-import json
+import asyncio
 import time
 import pytz
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple, Awaitable, Callable, Coroutine
 
-from app.database import db
+from app.database import Fence, db
 from app.config import settings
-from app.services.llm_service import llm_service
-from app.utils.prompts import build_prompt, extract_json_from_text, read_file
+from app.services.context import PromptContext, compact_json, fit_document
+from app.services.llm_router import ProviderDeltaCallback, llm_router
+from app.services.similarity import SubtopicIndex
+from app.services.snapshots import snapshot_service
+from app.services.unit_of_work import DayUnitOfWork, load_staged
+from app.utils.prompts import build_prompt, parse_json_response
 from app.utils.logging import logger
+from app.utils.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram("pipeline_stage_duration_seconds", "Duration of each pipeline stage", ["stage"])
+DAYS = metrics.counter("pipeline_days_total", "Simulated days by outcome", ["status"])
+SUBTOPIC_DUPLICATES = metrics.counter("pipeline_subtopic_duplicates_total", "Generated subtopics rejected as near-duplicates")
+
+# Receives stage transitions such as {"stage": "subtopic", "status": "started"},
+# and streamed LLM output as {"stage": ..., "status": "delta", "source", "provider", "text"}
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Prompt templates and the placeholders each stage fills in, verified at startup
+PIPELINE_TEMPLATES = {
+    "universe/subtopic_prompt.txt": ["UNIVERSE_SEED_JSON", "RECENT_TIMELINE_JSON", "ALL_PREVIOUS_SUBTOPICS_JSON"],
+    "universe/model_A_prompt.txt": ["UNIVERSE_SEED_JSON", "SUBTOPIC", "RECENT_TIMELINE_JSON"],
+    "universe/model_B_prompt.txt": ["UNIVERSE_SEED_JSON", "SUBTOPIC", "RECENT_TIMELINE_JSON"],
+    "universe/model_C_prompt.txt": ["UNIVERSE_SEED_JSON", "SUBTOPIC", "RECENT_TIMELINE_JSON", "MODEL_A_JSON", "MODEL_B_JSON"],
+}
+
+def parse_judgment(text: str) -> Dict[str, Any]:
+    judgment = parse_json_response(text)
+    if "accepted_log" not in judgment:
+        raise ValueError("'accepted_log' not found in response")
+    return judgment
+
+class DayCheckpoint(NamedTuple):
+    """What a day already has: staged stage outputs if unfinished, its committed documents if complete."""
+    subtopic: Optional[Dict[str, Any]]
+    model_a: Optional[Dict[str, Any]]
+    model_b: Optional[Dict[str, Any]]
+    final_event: Optional[Dict[str, Any]]
+
+    @property
+    def started(self) -> bool:
+        return self.subtopic is not None or self.complete
+
+    @property
+    def complete(self) -> bool:
+        return self.final_event is not None
 
 class PipelineService:
-    def get_universe_seed(self) -> str:
-        """Get universe seed from database instead of file"""
-        universe_doc = db.get_collection("universe").find_one()
-        if not universe_doc:
-            logger.warning("No universe document found in database, falling back to file")
-            return read_file("universe/universe_seed.json")
-        
-        # Remove MongoDB-specific fields
-        universe_copy = universe_doc.copy()
-        for key in ["_id", "created_at", "updated_at"]:
-            universe_copy.pop(key, None)
-        
-        return json.dumps(universe_copy, indent=2)
-    
-    def get_next_day_index(self) -> int:
-        last_subtopic = db.get_collection("subtopics").find_one(
-            {"universe_id": settings.UNIVERSE_ID},
-            sort=[("day_index", -1)]
+    def __init__(self):
+        self._subtopic_indexes: Dict[str, SubtopicIndex] = {}
+        # One run per universe at a time; created lazily so they bind to the running loop
+        self._universe_locks: Dict[str, asyncio.Lock] = {}
+
+    async def list_universes(self) -> List[str]:
+        """Universes to simulate on a scheduled tick: UNIVERSE_IDS if set, else every stored universe."""
+        if settings.UNIVERSE_IDS:
+            return [u.strip() for u in settings.UNIVERSE_IDS.split(",") if u.strip()]
+        stored = await db.get_async_collection("universe").distinct("universe_id")
+        return [settings.UNIVERSE_ID] + sorted(u for u in stored if u and u != settings.UNIVERSE_ID)
+
+    async def get_universe_doc(self, universe_id: str) -> Optional[Dict[str, Any]]:
+        query: Dict[str, Any] = {"universe_id": universe_id}
+        if universe_id == settings.UNIVERSE_ID:
+            # Single-universe deployments stored one seed document without a universe_id
+            query = {"$or": [query, {"universe_id": {"$exists": False}}]}
+        return await db.get_async_collection("universe").find_one(query, sort=[("universe_id", -1)])
+
+    async def build_context(self, universe_id: str, recent_limit: Optional[int] = None, before_day: Optional[int] = None) -> PromptContext:
+        """Read the universe seed and recent timeline (before `before_day`, if given) once for a whole run."""
+        timeline_query: Dict[str, Any] = {"universe_id": universe_id}
+        if before_day is not None:
+            timeline_query["day_index"] = {"$lt": before_day}
+        universe_doc, recent_events = await asyncio.gather(
+            self.get_universe_doc(universe_id),
+            db.get_async_collection("timeline").find(
+                timeline_query,
+                sort=[("day_index", -1)],
+                limit=recent_limit or settings.CONTEXT_RECENT_EVENTS
+            )
         )
-        return (last_subtopic["day_index"] + 1) if last_subtopic else 1
+        if not universe_doc and universe_id != settings.UNIVERSE_ID:
+            raise ValueError(f"No universe document found for '{universe_id}'")
+        return PromptContext(universe_id, universe_doc, recent_events[::-1])
 
-    def get_recent_events(self, limit: int = 15) -> str:
-        cursor = db.get_collection("timeline").find(
-            {"universe_id": settings.UNIVERSE_ID},
+    async def get_next_day_index(self, universe_id: str) -> int:
+        """
+        The day after the latest timeline entry. Days are committed together with
+        their timeline entry, so an unfinished day is always the next one; its
+        staged outputs are picked up by the run.
+        """
+        last_event = await db.get_async_collection("timeline").find_one(
+            {"universe_id": universe_id},
+            {"day_index": 1},
             sort=[("day_index", -1)]
-        ).limit(limit)
-        events = list(cursor)[::-1]
-        cleaned = []
-        for e in events:
-            e_copy = e.copy()
-            for key in ["_id", "created_at", "universe_id"]:
-                e_copy.pop(key, None)
-            cleaned.append(e_copy)
-        return json.dumps(cleaned, indent=2)
-
-    def get_previous_subtopics(self) -> str:
-        cursor = db.get_collection("subtopics").find(
-            {"universe_id": settings.UNIVERSE_ID},
+        )
+        return last_event["day_index"] + 1 if last_event else 1
+
+    async def load_checkpoint(self, universe_id: str, day_index: int) -> DayCheckpoint:
+        """
+        Read whatever a previous run of this day already staged or committed. Staged outputs
+        win; committed ones cover complete days and partial days written stage by stage
+        before days were committed as a unit.
+        """
+        prefix = f"{universe_id}-{day_index}"
+        staged, final_event, subtopic, model_a, model_b = await asyncio.gather(
+            load_staged(universe_id, day_index),
+            db.get_async_collection("timeline").find_one({"_id": f"{prefix}-0"}),
+            db.get_async_collection("subtopics").find_one({"_id": f"{prefix}-subtopic"}),
+            db.get_async_collection("proposals").find_one({"_id": f"{prefix}-A-0"}),
+            db.get_async_collection("proposals").find_one({"_id": f"{prefix}-B-0"})
+        )
+        if final_event:
+            return DayCheckpoint(subtopic, model_a, model_b, final_event)
+        return DayCheckpoint(
+            staged.get("subtopic") or subtopic,
+            staged.get("model_a") or model_a,
+            staged.get("model_b") or model_b,
+            None
+        )
+
+    async def get_subtopic_index(self, universe_id: str) -> SubtopicIndex:
+        """
+        A universe's similarity index, loaded from Mongo on first use. Every later call catches
+        it up with days committed since, including those simulated by other processes.
+        """
+        index = self._subtopic_indexes.get(universe_id)
+        if index is None:
+            index = self._subtopic_indexes[universe_id] = SubtopicIndex()
+        subtopics = await db.get_async_collection("subtopics").find(
+            {"universe_id": universe_id, "day_index": {"$gt": index.synced_day}},
+            projection={"_id": 0, "day_index": 1, "selected_subtopic": 1, "tags": 1},
             sort=[("day_index", 1)]
         )
-        cleaned = []
-        for s in cursor:
-            s_copy = s.copy()
-            for key in ["_id", "created_at", "universe_id"]:
-                s_copy.pop(key, None)
-            cleaned.append(s_copy)
-        return json.dumps(cleaned, indent=2)
+        added = 0
+        for s in subtopics:
+            added += index.add(s)
+            index.synced_day = max(index.synced_day, s["day_index"])
+        if added:
+            logger.info(f"Added {added} subtopics to the similarity index for {universe_id} ({len(index)} entries).")
+        return index
+
+    def reset_subtopic_index(self, universe_id: str):
+        self._subtopic_indexes.pop(universe_id, None)
+
+    async def get_previous_subtopics(self, context: PromptContext, rejected: Optional[List[str]] = None) -> str:
+        """Digest of all past subtopics plus the ones most related to the recent timeline."""
+        index = await self.get_subtopic_index(context.universe_id)
+        query = " ".join(e.get("subtopic") or "" for e in context.recent_events)
+        payload = {
+            **index.digest(),
+            "most_relevant": index.most_relevant(query, settings.SUBTOPIC_CONTEXT_K)
+        }
+        if rejected:
+            payload["rejected_as_duplicates"] = rejected
+        return compact_json(payload)
 
     def clean_doc_for_prompt(self, doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         if not doc: return {}
         d = doc.copy()
-        for key in ["_id", "created_at", "universe_id"]:
+        for key in ["_id", "created_at", "universe_id", "provider"]:
             d.pop(key, None)
         return d
 
-    def generate_subtopic(self, day_index: int) -> Optional[Dict[str, Any]]:
-        logger.info(f"--- Step 1: Generating Subtopic [Day {day_index}] ---")
-        
-        replacements = {
-            "{{UNIVERSE_SEED_JSON}}": self.get_universe_seed(),
-            "{{RECENT_TIMELINE_JSON}}": self.get_recent_events(),
-            "{{ALL_PREVIOUS_SUBTOPICS_JSON}}": self.get_previous_subtopics()
-        }
-        full_prompt = build_prompt("universe/subtopic_prompt.txt", replacements)
+    async def generate_subtopic(self, day: DayUnitOfWork, context: PromptContext, progress: Optional[ProgressCallback] = None) -> Optional[Dict[str, Any]]:
+        logger.info(f"--- Step 1: Generating Subtopic [{context.universe_id} Day {day.day_index}] ---")
         
+        index = await self.get_subtopic_index(context.universe_id)
+        rejected: List[str] = []
+        full_prompt = None
+
         for attempt in range(3):
-            try:
-                response_text = llm_service.generate_qwen(full_prompt)
-                event_data = json.loads(extract_json_from_text(response_text))
-                
-                subtopic_doc = {
-                    "_id": f"{settings.UNIVERSE_ID}-{day_index}-subtopic",
-                    "universe_id": settings.UNIVERSE_ID,
-                    "day_index": day_index,
-                    "selected_subtopic": event_data.get("selected_subtopic", "Unknown"),
-                    "reason": event_data.get("reason", ""),
-                    "tags": event_data.get("expected_focus_tags", []),
-                    "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
+            if full_prompt is None:
+                replacements = {
+                    "{{UNIVERSE_SEED_JSON}}": context.universe_seed_json,
+                    "{{RECENT_TIMELINE_JSON}}": context.timeline_json(settings.SUBTOPIC_TIMELINE_TOKENS),
+                    "{{ALL_PREVIOUS_SUBTOPICS_JSON}}": await self.get_previous_subtopics(context, rejected)
                 }
-                db.get_collection("subtopics").insert_one(subtopic_doc)
-                logger.info("Inserted subtopic into MongoDB.")
-                return subtopic_doc
+                full_prompt = build_prompt("universe/subtopic_prompt.txt", replacements)
+            try:
+                provider, event_data = await llm_router.complete("subtopic", full_prompt, parse_json_response, self._deltas("subtopic", "subtopic", progress))
             except Exception as e:
-                logger.error(f"Attempt {attempt+1} failed: {e}")
-                time.sleep(2)
+                logger.error(f"Error in Step 1: {e}")
+                return None
+            selected = event_data.get("selected_subtopic", "Unknown")
+
+            # Reject near-duplicates locally before any proposal or judge call is spent on them
+            duplicate = index.find_near_duplicate(selected, settings.SUBTOPIC_DUPLICATE_THRESHOLD)
+            if duplicate:
+                match, score = duplicate
+                logger.warning(f"Attempt {attempt+1} rejected: '{selected}' duplicates day {match['day_index']} ('{match['selected_subtopic']}', similarity {score:.2f})")
+                rejected.append(selected)
+                SUBTOPIC_DUPLICATES.inc()
+                full_prompt = None
+                continue
+
+            subtopic_doc = {
+                "_id": f"{context.universe_id}-{day.day_index}-subtopic",
+                "universe_id": context.universe_id,
+                "day_index": day.day_index,
+                "selected_subtopic": selected,
+                "reason": event_data.get("reason", ""),
+                "tags": event_data.get("expected_focus_tags", []),
+                "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
+            }
+            await day.stage("subtopic", subtopic_doc)
+            index.add(subtopic_doc)
+            logger.info(f"Staged subtopic from {provider}.")
+            return subtopic_doc
         return None
 
-    def generate_model_a(self, day_index: int, subtopic_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        logger.info("--- Step 2: Generating Model A Proposal ---")
+    async def generate_model_a(self, day: DayUnitOfWork, subtopic_data: Dict[str, Any], context: PromptContext, progress: Optional[ProgressCallback] = None) -> Optional[Dict[str, Any]]:
+        logger.info(f"--- Step 2: Generating Model A Proposal [{context.universe_id}] ---")
         
         replacements = {
-            "{{UNIVERSE_SEED_JSON}}": self.get_universe_seed(),
+            "{{UNIVERSE_SEED_JSON}}": context.universe_seed_json,
             "{{SUBTOPIC}}": subtopic_data.get("selected_subtopic", ""),
-            "{{RECENT_TIMELINE_JSON}}": self.get_recent_events()
+            "{{RECENT_TIMELINE_JSON}}": context.timeline_json(settings.PROPOSAL_TIMELINE_TOKENS)
         }
         full_prompt = build_prompt("universe/model_A_prompt.txt", replacements)
         
-        for attempt in range(3):
-            try:
-                response_text = llm_service.generate_gemini(full_prompt)
-                event_data = json.loads(extract_json_from_text(response_text))
-                
-                proposal_doc = {
-                    "_id": f"{settings.UNIVERSE_ID}-{day_index}-A-0",
-                    "universe_id": settings.UNIVERSE_ID,
-                    "day_index": day_index,
-                    "model": "A",
-                    "created_at": datetime.now(pytz.timezone("Asia/Kolkata")),
-                    **event_data,
-                    "subtopic": subtopic_data.get("selected_subtopic")
-                }
-                db.get_collection("proposals").insert_one(proposal_doc)
-                logger.info("Inserted Model A proposal into MongoDB.")
-                return proposal_doc
-            except Exception as e:
-                logger.error(f"Attempt {attempt+1} failed: {e}")
-                time.sleep(2)
-        return None
+        try:
+            provider, event_data = await llm_router.complete("model_a", full_prompt, parse_json_response, self._deltas("proposals", "model_a", progress))
+        except Exception as e:
+            logger.error(f"Error in Step 2: {e}")
+            return None
 
-    def generate_model_b(self, day_index: int, subtopic_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        logger.info("--- Step 3: Generating Model B Proposal ---")
+        proposal_doc = {
+            "_id": f"{context.universe_id}-{day.day_index}-A-0",
+            "universe_id": context.universe_id,
+            "day_index": day.day_index,
+            "model": "A",
+            "created_at": datetime.now(pytz.timezone("Asia/Kolkata")),
+            **event_data,
+            "subtopic": subtopic_data.get("selected_subtopic"),
+            "provider": provider
+        }
+        await day.stage("model_a", proposal_doc)
+        logger.info(f"Staged Model A proposal from {provider}.")
+        return proposal_doc
+
+    async def generate_model_b(self, day: DayUnitOfWork, subtopic_data: Dict[str, Any], context: PromptContext, progress: Optional[ProgressCallback] = None) -> Optional[Dict[str, Any]]:
+        logger.info(f"--- Step 3: Generating Model B Proposal [{context.universe_id}] ---")
         
         replacements = {
-            "{{UNIVERSE_SEED_JSON}}": self.get_universe_seed(),
+            "{{UNIVERSE_SEED_JSON}}": context.universe_seed_json,
             "{{SUBTOPIC}}": subtopic_data.get("selected_subtopic", ""),
-            "{{RECENT_TIMELINE_JSON}}": self.get_recent_events()
+            "{{RECENT_TIMELINE_JSON}}": context.timeline_json(settings.PROPOSAL_TIMELINE_TOKENS)
         }
         full_prompt = build_prompt("universe/model_B_prompt.txt", replacements)
 
         try:
-            response_text = llm_service.generate_deepseek(full_prompt)
-            event_data = json.loads(extract_json_from_text(response_text))
-            
-            proposal_doc = {
-                "_id": f"{settings.UNIVERSE_ID}-{day_index}-B-0",
-                "universe_id": settings.UNIVERSE_ID,
-                "day_index": day_index,
-                "model": "B",
-                "created_at": datetime.now(pytz.timezone("Asia/Kolkata")),
-                **event_data,
-                "subtopic": subtopic_data.get("selected_subtopic")
-            }
-            db.get_collection("proposals").insert_one(proposal_doc)
-            logger.info("Inserted Model B proposal into MongoDB.")
-            return proposal_doc
+            provider, event_data = await llm_router.complete("model_b", full_prompt, parse_json_response, self._deltas("proposals", "model_b", progress))
         except Exception as e:
             logger.error(f"Error in Step 3: {e}")
             return None
 
-    def generate_model_c(self, day_index: int, subtopic_data: Dict[str, Any], model_a_doc: Optional[Dict[str, Any]], model_b_doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        logger.info("--- Step 4: Generating Model C Judgment ---")
+        proposal_doc = {
+            "_id": f"{context.universe_id}-{day.day_index}-B-0",
+            "universe_id": context.universe_id,
+            "day_index": day.day_index,
+            "model": "B",
+            "created_at": datetime.now(pytz.timezone("Asia/Kolkata")),
+            **event_data,
+            "subtopic": subtopic_data.get("selected_subtopic"),
+            "provider": provider
+        }
+        await day.stage("model_b", proposal_doc)
+        logger.info(f"Staged Model B proposal from {provider}.")
+        return proposal_doc
+
+    async def generate_model_c(self, day: DayUnitOfWork, subtopic_data: Dict[str, Any], model_a_doc: Optional[Dict[str, Any]], model_b_doc: Optional[Dict[str, Any]], context: PromptContext, progress: Optional[ProgressCallback] = None) -> Optional[Dict[str, Any]]:
+        logger.info(f"--- Step 4: Generating Model C Judgment [{context.universe_id}] ---")
         
         replacements = {
-            "{{UNIVERSE_SEED_JSON}}": self.get_universe_seed(),
+            "{{UNIVERSE_SEED_JSON}}": context.universe_seed_json,
             "{{SUBTOPIC}}": subtopic_data.get("selected_subtopic", ""),
-            "{{RECENT_TIMELINE_JSON}}": self.get_recent_events(),
-            "{{MODEL_A_JSON}}": json.dumps(self.clean_doc_for_prompt(model_a_doc), indent=2),
-            "{{MODEL_B_JSON}}": json.dumps(self.clean_doc_for_prompt(model_b_doc), indent=2)
+            "{{RECENT_TIMELINE_JSON}}": context.timeline_json(settings.JUDGE_TIMELINE_TOKENS),
+            "{{MODEL_A_JSON}}": fit_document(self.clean_doc_for_prompt(model_a_doc), settings.JUDGE_PROPOSAL_TOKENS),
+            "{{MODEL_B_JSON}}": fit_document(self.clean_doc_for_prompt(model_b_doc), settings.JUDGE_PROPOSAL_TOKENS)
         }
         full_prompt = build_prompt("universe/model_C_prompt.txt", replacements)
 
         try:
-            response_text = llm_service.generate_groq(full_prompt)
-            response_json = json.loads(extract_json_from_text(response_text))
-
-            if "accepted_log" in response_json:
-                judgment_doc = {
-                    "_id": f"{settings.UNIVERSE_ID}-{day_index}-judgment",
-                    "universe_id": settings.UNIVERSE_ID,
-                    "day_index": day_index,
-                    "decision": response_json.get("decision", "N/A"),
-                    "reason": response_json.get("reason", "N/A"),
-                    "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
-                }
-                db.get_collection("judgements").insert_one(judgment_doc)
-                logger.info("Inserted judgment into 'judgements' collection.")
-
-                timeline_doc = {
-                    "_id": f"{settings.UNIVERSE_ID}-{day_index}-0",
-                    "universe_id": settings.UNIVERSE_ID,
-                    "day_index": day_index,
-                    "subtopic": subtopic_data.get("selected_subtopic"),
-                    "event": response_json["accepted_log"],
-                    "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
-                }
-                db.get_collection("timeline").insert_one(timeline_doc)
-                logger.info("Inserted accepted event into 'timeline' collection.")
-                return timeline_doc
-            else:
-                logger.error("Error: 'accepted_log' not found in response.")
-                return None
+            provider, response_json = await llm_router.complete("judge", full_prompt, parse_judgment, self._deltas("judgement", "judge", progress))
         except Exception as e:
             logger.error(f"Error in Step 4: {e}")
             return None
 
-    def run_daily_simulation(self) -> Dict[str, Any]:
-        day_index = self.get_next_day_index()
-        logger.info(f"Starting simulation for Day {day_index}")
-        
-        subtopic = self.generate_subtopic(day_index)
-        if not subtopic: raise Exception("Step 1 Failed")
-        
-        model_a = self.generate_model_a(day_index, subtopic)
-        model_b = self.generate_model_b(day_index, subtopic)
-        
-        if not model_a and not model_b: raise Exception("Step 2/3 Failed (Both models)")
-        
-        final_event = self.generate_model_c(day_index, subtopic, model_a, model_b)
-        if not final_event: raise Exception("Step 4 Failed")
-        
+        judgment_doc = {
+            "_id": f"{context.universe_id}-{day.day_index}-judgment",
+            "universe_id": context.universe_id,
+            "day_index": day.day_index,
+            "decision": response_json.get("decision", "N/A"),
+            "reason": response_json.get("reason", "N/A"),
+            "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
+        }
+        day.add("judgements", judgment_doc)
+
+        timeline_doc = {
+            "_id": f"{context.universe_id}-{day.day_index}-0",
+            "universe_id": context.universe_id,
+            "day_index": day.day_index,
+            "subtopic": subtopic_data.get("selected_subtopic"),
+            "event": response_json["accepted_log"],
+            "created_at": datetime.now(pytz.timezone("Asia/Kolkata"))
+        }
+        day.add("timeline", timeline_doc)
+        logger.info(f"Judgment from {provider} accepted an event.")
+        return timeline_doc
+
+    async def generate_proposals(
+        self,
+        day: DayUnitOfWork,
+        subtopic_data: Dict[str, Any],
+        context: PromptContext,
+        model_a: Optional[Dict[str, Any]] = None,
+        model_b: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Generate whichever of the Model A and Model B proposals is not already given,
+        concurrently unless disabled in settings.
+        """
+        if not settings.CONCURRENT_PROPOSALS:
+            model_a = model_a or await self.generate_model_a(day, subtopic_data, context, progress)
+            model_b = model_b or await self.generate_model_b(day, subtopic_data, context, progress)
+            return model_a, model_b
+
+        tasks = {}
+        if not model_a:
+            tasks["A"] = asyncio.create_task(self.generate_model_a(day, subtopic_data, context, progress))
+        if not model_b:
+            tasks["B"] = asyncio.create_task(self.generate_model_b(day, subtopic_data, context, progress))
+        if not tasks:
+            return model_a, model_b
+
+        try:
+            _, pending = await asyncio.wait(tasks.values(), timeout=settings.PROPOSAL_STAGE_TIMEOUT)
+            if pending:
+                # The judge tolerates a missing proposal, so go ahead with whatever has arrived
+                logger.warning(f"Proposal stage deadline of {settings.PROPOSAL_STAGE_TIMEOUT}s passed with {len(pending)} proposal(s) outstanding")
+        finally:
+            # Also on cancellation: never leave a proposal calling LLMs or writing to staging behind
+            outstanding = [task for task in tasks.values() if not task.done()]
+            for task in outstanding:
+                task.cancel()
+            await asyncio.gather(*outstanding, return_exceptions=True)
+
+        # Retrieve every exception, so a failure in one proposal is not left unobserved behind the other's
+        errors = [task.exception() for task in tasks.values() if not task.cancelled()]
+        failed = next((e for e in errors if e is not None), None)
+        if failed is not None:
+            raise failed
+        if "A" in tasks:
+            model_a = None if tasks["A"].cancelled() else tasks["A"].result()
+        if "B" in tasks:
+            model_b = None if tasks["B"].cancelled() else tasks["B"].result()
+        return model_a, model_b
+
+    def _universe_lock(self, universe_id: str) -> asyncio.Lock:
+        lock = self._universe_locks.get(universe_id)
+        if lock is None:
+            lock = self._universe_locks[universe_id] = asyncio.Lock()
+        return lock
+
+    async def run_daily_simulation(
+        self,
+        universe_id: Optional[str] = None,
+        day_index: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+        fence: Optional[Callable[[], Fence]] = None
+    ) -> Dict[str, Any]:
+        """Simulate one day; with a `fence`, its commit only goes ahead while the fence still matches."""
+        universe_id = universe_id or settings.UNIVERSE_ID
+        async with self._universe_lock(universe_id):
+            try:
+                result = await self._run_day(universe_id, day_index, progress, fence)
+            except Exception:
+                DAYS.inc(status="failed")
+                raise
+        DAYS.inc(status="succeeded")
+        return result
+
+    async def _stage(
+        self,
+        name: str,
+        timings: Dict[str, float],
+        progress: Optional[ProgressCallback],
+        coro: Coroutine[Any, Any, Any],
+        error: str,
+        ok: Callable[[Any], bool] = bool
+    ) -> Any:
+        """
+        Await one pipeline stage, recording its duration and reporting it to `progress`.
+        A stage that raises or whose result fails `ok` is reported as failed and raises `error`.
+        """
+        if progress:
+            try:
+                await progress({"stage": name, "status": "started"})
+            except BaseException:
+                # e.g. LeaseLost before the stage began: its coroutine will never be awaited
+                coro.close()
+                raise
+        stage_start = time.perf_counter()
+        raised = False
+        try:
+            result = await coro
+        except Exception as e:
+            result, error, raised = None, f"{error}: {e}", True
+        elapsed = time.perf_counter() - stage_start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings[name] = round(elapsed, 3)
+        if raised or not ok(result):
+            if progress:
+                await progress({"stage": name, "status": "failed", "seconds": timings[name], "error": error})
+            raise Exception(error)
+        if progress:
+            await progress({"stage": name, "status": "completed", "seconds": timings[name]})
+        return result
+
+    def _deltas(self, stage: str, source: str, progress: Optional[ProgressCallback]) -> Optional[ProviderDeltaCallback]:
+        """Report streamed LLM output for a stage as {"status": "delta"} progress events."""
+        if progress is None:
+            return None
+
+        async def on_delta(provider: str, text: str):
+            await progress({"stage": stage, "status": "delta", "source": source, "provider": provider, "text": text})
+        return on_delta
+
+    async def _reuse(self, name: str, progress: Optional[ProgressCallback]):
+        logger.info(f"Reusing stored {name} from an earlier run")
+        if progress:
+            await progress({"stage": name, "status": "reused"})
+
+    async def _run_day(self, universe_id: str, day_index: Optional[int] = None, progress: Optional[ProgressCallback] = None, fence: Optional[Callable[[], Fence]] = None) -> Dict[str, Any]:
+        """
+        Run one day, resuming from whatever an earlier, failed run of it already staged:
+        a staged subtopic or proposal is reused instead of being generated again.
+        Nothing is visible to readers until the judgement commits the whole day.
+        """
+        day_index = day_index or await self.get_next_day_index(universe_id)
+        checkpoint = await self.load_checkpoint(universe_id, day_index)
+        timings: Dict[str, float] = {}
+        if checkpoint.complete:
+            logger.info(f"{universe_id} Day {day_index} is already complete")
+            return {
+                "universe_id": universe_id,
+                "day_index": day_index,
+                "subtopic": checkpoint.subtopic,
+                "model_a": checkpoint.model_a,
+                "model_b": checkpoint.model_b,
+                "final_event": checkpoint.final_event,
+                "timings": timings
+            }
+
+        logger.info(f"{'Resuming' if checkpoint.started else 'Starting'} simulation for {universe_id} Day {day_index}")
+        context = await self.build_context(universe_id, before_day=day_index)
+        started = time.perf_counter()
+        day = DayUnitOfWork(universe_id, day_index, fence)
+
+        subtopic = checkpoint.subtopic
+        if subtopic:
+            day.restore("subtopic", subtopic)
+            (await self.get_subtopic_index(universe_id)).add(subtopic)
+            await self._reuse("subtopic", progress)
+        else:
+            subtopic = await self._stage("subtopic", timings, progress, self.generate_subtopic(day, context, progress), "Step 1 Failed")
+
+        model_a, model_b = checkpoint.model_a, checkpoint.model_b
+        for output, doc in (("model_a", model_a), ("model_b", model_b)):
+            if doc:
+                day.restore(output, doc)
+        if model_a and model_b:
+            await self._reuse("proposals", progress)
+        else:
+            model_a, model_b = await self._stage(
+                "proposals", timings, progress,
+                self.generate_proposals(day, subtopic, context, model_a, model_b, progress),
+                "Step 2/3 Failed (Both models)",
+                ok=any
+            )
+
+        final_event = await self._stage("judgement", timings, progress, self.generate_model_c(day, subtopic, model_a, model_b, context, progress), "Step 4 Failed")
+        await day.commit()
+
+        timings["total"] = round(time.perf_counter() - started, 3)
+        logger.info(f"{universe_id} Day {day_index} stage timings (s): {timings}")
+        try:
+            await snapshot_service.write(day)
+        except Exception as e:
+            # The day is committed; a stale snapshot is refreshed by the next one
+            logger.error(f"Snapshot for {universe_id} Day {day_index} failed: {e}")
+
         return {
+            "universe_id": universe_id,
             "day_index": day_index,
             "subtopic": subtopic,
             "model_a": model_a,
             "model_b": model_b,
-            "final_event": final_event
+            "final_event": final_event,
+            "timings": timings
         }
 
 pipeline_service = PipelineService()
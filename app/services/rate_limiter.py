@@ -0,0 +1,172 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+LLM_QUEUE_SECONDS = metrics.histogram("llm_queue_wait_seconds", "Time a provider call waited for an in-flight slot and its RPM/TPM budget", ["provider"])
+LLM_WAITING = metrics.gauge("llm_requests_waiting", "Provider calls queued behind the rate limiter", ["provider"])
+LLM_IN_FLIGHT = metrics.gauge("llm_requests_in_flight", "Provider calls currently running", ["provider"])
+LLM_RATE_LIMITED = metrics.counter("llm_rate_limited_total", "429 responses, each pausing the provider for its Retry-After", ["provider"])
+
+
+def parse_limits(spec: str) -> Dict[str, float]:
+    """Parse "qwen=20,groq=30" into {"qwen": 20.0, "groq": 30.0}."""
+    limits = {}
+    for part in spec.split(","):
+        key, sep, value = part.rpartition("=")
+        if sep and key.strip():
+            limits[key.strip()] = float(value)
+    return limits
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds a provider asked us to back off, or None if `error` is not a rate limit.
+    Reads Retry-After (seconds or an HTTP date) and retry-after-ms from the response
+    of OpenAI-compatible SDK errors; a 429 without either gets LLM_RATE_LIMIT_COOLDOWN.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None) or getattr(error, "code", None)
+    headers = getattr(response, "headers", None) or {}
+    if status != 429:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return settings.LLM_RATE_LIMIT_COOLDOWN
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` per second up to a burst of `capacity`.
+    Takes may overdraw it (a prompt larger than the burst, or tokens counted
+    after the fact), which later takers then wait out.
+    """
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` (at most a full bucket) can be taken."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class ProviderLimiter:
+    """
+    Rate limits for one provider and model: at most `max_in_flight` concurrent
+    calls, `rpm` requests and `tpm` estimated tokens per minute (0 = unlimited),
+    and a pause after a 429 for as long as its Retry-After asks. Callers queue
+    in FIFO order, so one waiter sleeps until the budget allows it instead of
+    every waiter polling.
+    """
+    def __init__(self, provider: str, rpm: float, tpm: float, max_in_flight: int):
+        self.provider = provider
+        self.requests = TokenBucket(rpm, max(1.0, rpm * settings.LLM_RATE_BURST)) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, max(1.0, tpm * settings.LLM_RATE_BURST)) if tpm > 0 else None
+        self.max_in_flight = max_in_flight
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._budget = asyncio.Lock()
+
+    @property
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def delay(self, tokens: int) -> float:
+        """Seconds until a call of `tokens` prompt tokens would be let through, ignoring the queue."""
+        return max(
+            self.pause_remaining,
+            self.requests.wait_time(1) if self.requests else 0.0,
+            self.tokens.wait_time(tokens) if self.tokens else 0.0,
+        )
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[None]:
+        """Hold an in-flight slot for one call of `tokens` prompt tokens, once the budget allows it."""
+        started = time.perf_counter()
+        self.waiting += 1
+        LLM_WAITING.inc(provider=self.provider)
+        try:
+            await self._slots.acquire()
+            try:
+                async with self._budget:
+                    # Re-checked after each sleep: a 429 elsewhere may have extended the pause
+                    delay = self.delay(tokens)
+                    while delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = self.delay(tokens)
+                    if self.requests:
+                        self.requests.take(1)
+                    if self.tokens:
+                        self.tokens.take(tokens)
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+            LLM_WAITING.dec(provider=self.provider)
+            LLM_QUEUE_SECONDS.observe(time.perf_counter() - started, provider=self.provider)
+
+        self.in_flight += 1
+        LLM_IN_FLIGHT.inc(provider=self.provider)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            LLM_IN_FLIGHT.dec(provider=self.provider)
+            self._slots.release()
+
+    def consume(self, tokens: int):
+        """Charge tokens only known after the call (the response) to the TPM budget."""
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    def pause(self, seconds: float):
+        """Hold back every queued call to this provider for `seconds`."""
+        LLM_RATE_LIMITED.inc(provider=self.provider)
+        seconds = min(seconds, settings.LLM_RETRY_AFTER_MAX)
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting,
+            "paused_seconds": round(self.pause_remaining, 3),
+            "rpm": self.requests.rate * 60 if self.requests else None,
+            "tpm": self.tokens.rate * 60 if self.tokens else None,
+            "requests_available": round(self.requests.available, 2) if self.requests else None,
+            "tokens_available": round(self.tokens.available) if self.tokens else None,
+        }
@@ -1,51 +1,64 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.mongodb import MongoDBJobStore
-from apscheduler.triggers.cron import CronTrigger
 from app.config import settings
 from app.utils.logging import logger
 from app.database import db
-import httpx
-from datetime import datetime
+from app.services.jobs import job_service
+from app.services.leader import scheduler_lease
 import pytz
 
 def trigger_daily_simulation():
     """
-    Trigger the daily simulation via API.
-    This runs in a separate thread managed by APScheduler.
+    Enqueue one simulation job per universe.
+    This runs in a separate thread managed by APScheduler; the jobs themselves
+    run on the job worker, so this returns as soon as they are recorded.
     """
+    lease_token = None
+    if settings.LEADER_ELECTION:
+        lease_token = scheduler_lease.token
+        if not scheduler_lease.holds(lease_token):
+            logger.warning("Skipping scheduled simulation: this process no longer holds the scheduler lease.")
+            return
     logger.info("Scheduler triggering daily simulation...")
-    
-    # We need to run the async HTTP call in a sync context
     try:
-        # Use a new event loop for this thread if needed, or run_in_executor
-        # Since this is a sync method called by APScheduler, we can use httpx.Client (sync)
-        # or asyncio.run() with httpx.AsyncClient.
-        # Using sync Client for simplicity in this thread.
-        
-        headers = {"x-admin-key": settings.ADMIN_API_KEY}
-        url = f"{settings.API_BASE_URL}/admin/simulate/day"
-        
-        with httpx.Client(timeout=300.0) as client: # 5 min timeout for long simulation
-            response = client.post(url, headers=headers)
-            
-            if response.status_code == 200:
-                logger.info(f"Scheduled simulation completed successfully: {response.json()}")
-            else:
-                logger.error(f"Scheduled simulation failed with status {response.status_code}: {response.text}")
-                
+        jobs = job_service.submit_universes_threadsafe(lease_token=lease_token)
+        logger.info(f"Scheduled simulation jobs: {[(job['_id'], job['status']) for job in jobs]}")
     except Exception as e:
         logger.error(f"Error in scheduled simulation job: {str(e)}")
 
 class SchedulerService:
+    """
+    Runs the daily simulation cron. With LEADER_ELECTION, every process campaigns
+    for the scheduler lease and only the holder runs APScheduler; the others only
+    serve reads and take over if the holder stops renewing.
+    """
     def __init__(self):
         self.scheduler = None
         self.job_id = "daily_simulation"
 
     def start(self):
-        """Initialize and start the scheduler."""
+        """Initialize and start the scheduler, or campaign for the lease that allows it."""
         if not settings.ENABLE_SCHEDULER:
             logger.info("Scheduler is disabled via configuration.")
             return
+        if settings.LEADER_ELECTION:
+            scheduler_lease.start(on_elected=self._on_elected, on_demoted=self._stop_scheduler)
+            return
+        self._start_scheduler()
+
+    def _on_elected(self):
+        self._start_scheduler()
+        # Days the previous leader had in flight are re-queued under our token now, not at the next tick
+        try:
+            adopted = job_service.adopt_orphans_threadsafe(scheduler_lease.token)
+            if adopted:
+                logger.info(f"Adopted {len(adopted)} job(s) from the previous scheduler leader")
+        except Exception as e:
+            logger.error(f"Failed to adopt jobs from the previous scheduler leader: {e}")
+
+    def _start_scheduler(self):
+        # Imported here so replicas with the scheduler disabled never load APScheduler
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.jobstores.mongodb import MongoDBJobStore
+        from apscheduler.triggers.cron import CronTrigger
 
         try:
             # Configure MongoDB job store
@@ -81,10 +94,15 @@ class SchedulerService:
             logger.error(f"Failed to start scheduler: {str(e)}")
             # Don't raise, just log. We don't want to crash the app if scheduler fails.
 
-    def shutdown(self):
-        """Shutdown the scheduler."""
+    def _stop_scheduler(self):
         if self.scheduler and self.scheduler.running:
-            self.scheduler.shutdown()
+            self.scheduler.shutdown(wait=False)
             logger.info("Scheduler shut down.")
+        self.scheduler = None
+
+    def shutdown(self):
+        """Shutdown the scheduler and hand the lease to another process."""
+        scheduler_lease.stop()
+        self._stop_scheduler()
 
 scheduler_service = SchedulerService()
@@ -0,0 +1,164 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.database import db
+from app.utils.logging import logger
+from app.utils.response_cache import response_cache
+
+SEARCH_COLLECTION = "search"
+SEARCH_KINDS = ["timeline", "subtopic", "proposal"]
+SNIPPET_CHARS = 240
+# Fields of stored documents that are bookkeeping rather than searchable text
+SKIPPED_FIELDS = {"_id", "universe_id", "day_index", "created_at", "model", "provider"}
+
+
+def _strings(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            if k not in SKIPPED_FIELDS:
+                yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+
+
+def _search_doc(source: Dict[str, Any], kind: str, title: str, text: str, tags: List[str]) -> Dict[str, Any]:
+    text = text.strip()
+    doc = {
+        "_id": source["_id"],
+        "universe_id": source["universe_id"],
+        "day_index": source["day_index"],
+        "kind": kind,
+        "title": title or "",
+        "text": text,
+        "snippet": text[:SNIPPET_CHARS],
+        "tags": tags,
+        "created_at": source.get("created_at"),
+    }
+    if "model" in source:
+        doc["model"] = source["model"]
+    return doc
+
+
+def build_search_documents(documents: Dict[str, Dict[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    One search document per timeline entry, subtopic and proposal of a day, keyed by
+    the source _id and tagged with the day's subtopic tags and the event type.
+    `documents` maps collection name to the day's documents, as a DayUnitOfWork holds them.
+    """
+    subtopic = next(iter(documents.get("subtopics", {}).values()), None)
+    tags = sorted({t.strip().lower() for t in (subtopic or {}).get("tags", []) if t and t.strip()})
+    search_docs = []
+    if subtopic:
+        search_docs.append(_search_doc(subtopic, "subtopic", subtopic.get("selected_subtopic"), subtopic.get("reason") or "", tags))
+    for event in documents.get("timeline", {}).values():
+        body = event.get("event") or {}
+        event_tags = sorted(set(tags) | ({str(body["event_type"]).lower()} if body.get("event_type") else set()))
+        search_docs.append(_search_doc(event, "timeline", body.get("title"), " ".join(_strings(body)), event_tags))
+    for proposal in documents.get("proposals", {}).values():
+        search_docs.append(_search_doc(proposal, "proposal", proposal.get("title"), " ".join(_strings(proposal)), tags))
+    return search_docs
+
+
+async def search(
+    universe_id: str,
+    q: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    kinds: Optional[List[str]] = None,
+    from_day: Optional[int] = None,
+    to_day: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Ranked search over a universe's timeline, subtopics and proposals.
+    Text queries use the text index and rank by text score, then recency; without one,
+    results are newest first. Tags must all match. Totals and tag/kind facets are
+    computed over the best SEARCH_MAX_MATCHES matches. Without text, the newest-first
+    order is read from an index, so the cap also bounds how much is scanned; text
+    queries score every match before ranking.
+    """
+    match: Dict[str, Any] = {"universe_id": universe_id}
+    if q:
+        match["$text"] = {"$search": q}
+    if tags:
+        match["tags"] = {"$all": [t.lower() for t in tags]}
+    if kinds:
+        match["kind"] = {"$in": kinds}
+    if from_day is not None or to_day is not None:
+        match["day_index"] = {
+            **({"$gte": from_day} if from_day is not None else {}),
+            **({"$lte": to_day} if to_day is not None else {})
+        }
+
+    pipeline: List[Dict[str, Any]] = [{"$match": match}]
+    if q:
+        pipeline += [
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": {"score": -1, "day_index": -1, "_id": 1}}
+        ]
+    else:
+        pipeline.append({"$sort": {"day_index": -1, "_id": 1}})
+    pipeline += [
+        {"$limit": settings.SEARCH_MAX_MATCHES},
+        {"$facet": {
+            "results": [
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "text": 0, "universe_id": 0}}
+            ],
+            "total": [{"$count": "count"}],
+            "tags": [
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": settings.SEARCH_FACET_SIZE}
+            ],
+            "kinds": [
+                {"$group": {"_id": "$kind", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}}
+            ]
+        }}
+    ]
+    facets = (await db.get_async_collection(SEARCH_COLLECTION).aggregate(pipeline))[0]
+    total = facets["total"][0]["count"] if facets["total"] else 0
+    return {
+        "total": total,
+        "capped": total >= settings.SEARCH_MAX_MATCHES,
+        "results": facets["results"],
+        "facets": {
+            name: [{"value": f["_id"], "count": f["count"]} for f in facets[name]]
+            for name in ("tags", "kinds")
+        }
+    }
+
+
+async def reindex(universe_id: str, batch_days: int = 500) -> int:
+    """
+    Build search documents for days stored before search existed. New days are
+    indexed as part of their commit, so this is only needed once per universe.
+    """
+    indexed = 0
+    async for events in db.get_async_collection("timeline").iterate(
+        {"universe_id": universe_id},
+        sort=[("day_index", 1), ("_id", 1)],
+        batch_size=batch_days
+    ):
+        day_range = {"universe_id": universe_id, "day_index": {"$gte": events[0]["day_index"], "$lte": events[-1]["day_index"]}}
+        subtopics, proposals = await asyncio.gather(
+            db.get_async_collection("subtopics").find(day_range),
+            db.get_async_collection("proposals").find(day_range)
+        )
+        days: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        for name, docs in (("timeline", events), ("subtopics", subtopics), ("proposals", proposals)):
+            for doc in docs:
+                days.setdefault(doc["day_index"], {}).setdefault(name, {})[doc["_id"]] = doc
+        search_docs = [d for documents in days.values() for d in build_search_documents(documents)]
+        await db.run("bulk_upsert", db.bulk_upsert, {SEARCH_COLLECTION: search_docs})
+        indexed += len(days)
+    response_cache.invalidate(universe_id, SEARCH_COLLECTION)
+    logger.info(f"Reindexed search for {universe_id}: {indexed} days")
+    return indexed
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+
+def char_shingles(text: str, size: int = 3) -> Set[str]:
+    text = normalize(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SubtopicIndex:
+    """
+    Incrementally maintained similarity index over past subtopics.
+
+    Near-duplicates are found with MinHash signatures over character shingles,
+    bucketed with LSH so a lookup only compares against a handful of candidates.
+    Relevance ranking uses an inverted index of subtopic and tag tokens with
+    IDF weighting, so only entries sharing terms with the query are scored.
+    """
+    def __init__(self, num_perm: int = 32, bands: int = 8):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Deterministic permutation coefficients so signatures are stable across processes
+        self._perms = [
+            (_hash64(f"a{i}") % (_MERSENNE_PRIME - 1) + 1, _hash64(f"b{i}") % _MERSENNE_PRIME)
+            for i in range(num_perm)
+        ]
+        self.entries: List[Dict[str, Any]] = []
+        self._shingles: List[Set[str]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._tag_counts: Counter = Counter()
+        self._keys: Set[Tuple[Any, str]] = set()
+        # Highest day_index loaded from the database; later days are caught up from there
+        self.synced_day = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _signature(self, shingles: Set[str]) -> List[int]:
+        hashes = [_hash64(s) for s in shingles] or [0]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature: List[int]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    @staticmethod
+    def _terms(subtopic: str, tags: Iterable[str]) -> Set[str]:
+        terms = set(tokens(subtopic))
+        for tag in tags or []:
+            terms.update(f"tag:{t}" for t in tokens(tag))
+        return terms
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        """
+        Index one subtopic document (needs `selected_subtopic`, optionally `tags` and `day_index`).
+        Returns False if the same subtopic for the same day is already indexed.
+        """
+        idx = len(self.entries)
+        compact = {
+            "day_index": entry.get("day_index"),
+            "selected_subtopic": entry.get("selected_subtopic", ""),
+            "tags": list(entry.get("tags") or []),
+        }
+        key = (compact["day_index"], compact["selected_subtopic"])
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        shingles = char_shingles(compact["selected_subtopic"])
+        self.entries.append(compact)
+        self._shingles.append(shingles)
+        for key in self._band_keys(self._signature(shingles)):
+            self._buckets[key].append(idx)
+        for term in self._terms(compact["selected_subtopic"], compact["tags"]):
+            self._postings[term].add(idx)
+        self._tag_counts.update(t.lower() for t in compact["tags"])
+        return True
+
+    def find_near_duplicate(self, subtopic: str, threshold: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return the most similar indexed entry if its shingle Jaccard is at least `threshold`."""
+        shingles = char_shingles(subtopic)
+        candidates: Set[int] = set()
+        for key in self._band_keys(self._signature(shingles)):
+            candidates.update(self._buckets.get(key, ()))
+
+        best: Optional[Tuple[Dict[str, Any], float]] = None
+        for idx in candidates:
+            score = jaccard(shingles, self._shingles[idx])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (self.entries[idx], score)
+        return best
+
+    def most_relevant(self, query: str, k: int, tags: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Rank indexed entries by IDF-weighted term overlap with `query`; ties go to later days."""
+        n = len(self.entries)
+        if n <= k:
+            return list(self.entries)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in self._terms(query, tags):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + n / len(postings))
+            for idx in postings:
+                scores[idx] += idf
+        ranked = sorted(scores, key=lambda i: (scores[i], i), reverse=True)[:k]
+        return [self.entries[i] for i in sorted(ranked)]
+
+    def digest(self, top_tags: int = 20) -> Dict[str, Any]:
+        """Compact summary of the whole history for the prompt."""
+        days = [e["day_index"] for e in self.entries if e.get("day_index") is not None]
+        return {
+            "total_previous_subtopics": len(self.entries),
+            "day_range": [min(days), max(days)] if days else [],
+            "most_used_tags": [tag for tag, _ in self._tag_counts.most_common(top_tags)],
+        }
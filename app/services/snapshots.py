@@ -0,0 +1,89 @@
+import asyncio
+import gzip
+import os
+import shutil
+
+from app.config import settings
+from app.database import db
+from app.services.day_view import HIDDEN_FIELDS, day_view
+from app.services.unit_of_work import DayUnitOfWork
+from app.utils.logging import logger
+from app.utils.serialization import dumps
+
+SNAPSHOTS = ["timeline", "latest"]
+
+
+class SnapshotService:
+    """
+    Pre-rendered, gzip-compressed JSON of each universe's timeline, rewritten after
+    every simulated day so readers can be served a static file with no database work:
+
+        {SNAPSHOT_DIR}/{universe_id}/timeline.json.gz  every timeline event, oldest first
+        {SNAPSHOT_DIR}/{universe_id}/latest.json.gz    the latest day's event, subtopic, proposals and judgement
+    """
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.SNAPSHOT_DIR)
+
+    def directory(self, universe_id: str) -> str:
+        """A universe's snapshot directory, refusing any id that would resolve outside SNAPSHOT_DIR."""
+        root = os.path.realpath(settings.SNAPSHOT_DIR)
+        target = os.path.realpath(os.path.join(root, universe_id))
+        if os.path.dirname(target) != root:
+            raise ValueError(f"Invalid universe id for snapshots: {universe_id!r}")
+        return target
+
+    def path(self, universe_id: str, name: str) -> str:
+        return os.path.join(self.directory(universe_id), f"{name}.json.gz")
+
+    async def write(self, day: DayUnitOfWork):
+        """Rewrite both snapshots after `day` has been committed."""
+        if not self.enabled:
+            return
+        docs = {name: list(d.values()) for name, d in day.documents.items()}
+        latest = day_view(
+            day.day_index,
+            next(iter(docs.get("timeline", [])), None),
+            next(iter(docs.get("subtopics", [])), None),
+            sorted(docs.get("proposals", []), key=lambda p: p["_id"]),
+            next(iter(docs.get("judgements", [])), None)
+        )
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_timeline, day.universe_id)
+        await loop.run_in_executor(None, self._write_file, self.path(day.universe_id, "latest"), dumps(latest))
+        logger.info(f"Wrote snapshots for {day.universe_id} Day {day.day_index}")
+
+    def remove(self, universe_id: str):
+        if self.enabled:
+            shutil.rmtree(self.directory(universe_id), ignore_errors=True)
+
+    def _write_timeline(self, universe_id: str):
+        # Streamed from the cursor into the file, so memory stays flat as the timeline grows.
+        # day_index is unique per universe in the timeline, so the index gives this order as is
+        cursor = db.get_collection("timeline").find(
+            {"universe_id": universe_id},
+            {f: 0 for f in HIDDEN_FIELDS},
+            sort=[("day_index", 1)],
+            batch_size=settings.EXPORT_BATCH_SIZE
+        )
+        path = self.path(universe_id, "timeline")
+        with self._open(path) as f:
+            f.write(b"[")
+            for i, doc in enumerate(cursor):
+                f.write(b"," + dumps(doc) if i else dumps(doc))
+            f.write(b"]")
+        os.replace(path + ".tmp", path)
+
+    def _write_file(self, path: str, body: bytes):
+        with self._open(path) as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _open(path: str):
+        # Written beside the target and renamed over it, so readers never see a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return gzip.open(path + ".tmp", "wb", compresslevel=6)
+
+
+snapshot_service = SnapshotService()
@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pytz
+
+from app.database import Fence, db
+from app.services.search import SEARCH_COLLECTION, build_search_documents
+from app.utils.logging import logger
+from app.utils.response_cache import response_cache
+
+STAGING_COLLECTION = "day_staging"
+# Stage outputs kept in a day's staging document, and where they are committed
+STAGED_OUTPUTS = {"subtopic": "subtopics", "model_a": "proposals", "model_b": "proposals"}
+# The timeline entry marks a day complete, so it is written last
+COMMIT_ORDER = ["subtopics", "proposals", "judgements", SEARCH_COLLECTION, "timeline"]
+
+
+class DayUnitOfWork:
+    """
+    Buffers one simulated day's documents and writes them together.
+
+    Outputs a resume needs (the subtopic and proposals) are also saved to the
+    day's `day_staging` document as each stage finishes. `commit()` then upserts
+    everything with one bulk write per collection, inside a single transaction
+    on replica sets, and drops the staging document. With a `fence` the commit
+    only goes ahead while the fence still matches (see Database.bulk_upsert).
+    """
+    def __init__(self, universe_id: str, day_index: int, fence: Optional[Callable[[], Fence]] = None):
+        self.universe_id = universe_id
+        self.day_index = day_index
+        self.fence = fence
+        self.documents: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    @property
+    def staging_id(self) -> str:
+        return f"{self.universe_id}-{self.day_index}"
+
+    def add(self, collection: str, doc: Dict[str, Any]):
+        """Buffer a document for the commit; a document with the same _id replaces it."""
+        self.documents.setdefault(collection, {})[doc["_id"]] = doc
+
+    def restore(self, output: str, doc: Dict[str, Any]):
+        """Buffer a stage output recovered from staging, without writing it again."""
+        self.add(STAGED_OUTPUTS[output], doc)
+
+    async def stage(self, output: str, doc: Dict[str, Any]):
+        """Buffer a stage output and save it to staging so a failed day can resume from it."""
+        self.add(STAGED_OUTPUTS[output], doc)
+        await db.get_async_collection(STAGING_COLLECTION).update_one(
+            {"_id": self.staging_id},
+            {
+                "$set": {output: doc, "updated_at": datetime.now(pytz.timezone("Asia/Kolkata"))},
+                "$setOnInsert": {"universe_id": self.universe_id, "day_index": self.day_index}
+            },
+            upsert=True
+        )
+
+    async def commit(self):
+        await write_days([self], fence=self.fence)
+        await db.get_async_collection(STAGING_COLLECTION).delete_many({"_id": self.staging_id})
+        logger.info(f"Committed {self.universe_id} Day {self.day_index} ({sum(len(d) for d in self.documents.values())} documents)")
+
+
+async def load_staged(universe_id: str, day_index: int) -> Dict[str, Any]:
+    """Stage outputs saved by an unfinished run of a day, keyed like STAGED_OUTPUTS."""
+    staged = await db.get_async_collection(STAGING_COLLECTION).find_one({"_id": f"{universe_id}-{day_index}"})
+    return {k: v for k, v in (staged or {}).items() if k in STAGED_OUTPUTS}
+
+
+async def write_days(units: Iterable[DayUnitOfWork], upsert: bool = True, fence: Optional[Callable[[], Fence]] = None):
+    """
+    Upsert the buffered documents of several days, plus their search documents,
+    together and drop the cached responses they change.
+    """
+    batches: Dict[str, List[Dict[str, Any]]] = {name: [] for name in COMMIT_ORDER}
+    universes = set()
+    for unit in units:
+        universes.add(unit.universe_id)
+        for name, docs in unit.documents.items():
+            batches.setdefault(name, []).extend(docs.values())
+        batches[SEARCH_COLLECTION].extend(build_search_documents(unit.documents))
+    await db.run("bulk_upsert", db.bulk_upsert, batches, upsert=upsert, fence=fence)
+    for universe_id in universes:
+        for name, docs in batches.items():
+            if docs:
+                response_cache.invalidate(universe_id, name)
+
+
+async def import_days(units: Iterable[DayUnitOfWork], batch_days: int = 500, upsert: bool = True) -> int:
+    """
+    Backfill many complete days, `batch_days` at a time, with the same idempotent upserts
+    as a simulated day. Returns the number of days written. `upsert=False` plainly inserts,
+    for backfilling days known not to exist yet.
+    """
+    batch: List[DayUnitOfWork] = []
+    written = 0
+    for unit in units:
+        batch.append(unit)
+        if len(batch) >= batch_days:
+            await write_days(batch, upsert)
+            written += len(batch)
+            batch = []
+    if batch:
+        await write_days(batch, upsert)
+        written += len(batch)
+    logger.info(f"Imported {written} days")
+    return written
@@ -1,6 +1,12 @@
-from typing import Dict
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Mapping
+from app.config import settings
 from app.utils.logging import logger
 
+PLACEHOLDER_RE = re.compile(r"\{\{([A-Z0-9_]+)\}\}")
+
 def read_file(filepath: str) -> str:
     try:
         with open(filepath, "r", encoding='utf-8') as f:
@@ -9,11 +15,68 @@ def read_file(filepath: str) -> str:
         logger.warning(f"{filepath} not found.")
         return ""
 
+class PromptTemplate:
+    """A template split once into literal segments and placeholder names."""
+    def __init__(self, path: str, text: str, mtime: float):
+        self.path = path
+        self.mtime = mtime
+        pieces = PLACEHOLDER_RE.split(text)
+        # split() alternates literal, name, literal, ... so literals sit at even positions
+        self.literals: List[str] = pieces[0::2]
+        self.names: List[str] = pieces[1::2]
+        self.placeholders = frozenset(self.names)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        missing = self.placeholders.difference(values)
+        if missing:
+            raise KeyError(f"{self.path} is missing values for {sorted(missing)}")
+        out = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            out.append(values[name])
+            out.append(literal)
+        return "".join(out)
+
+
+class TemplateRegistry:
+    """
+    Loads and compiles prompt templates once, reloading a file only when its
+    mtime changes (and only if PROMPT_TEMPLATE_RELOAD is enabled).
+    """
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def _load(self, path: str) -> PromptTemplate:
+        mtime = os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            template = PromptTemplate(path, f.read(), mtime)
+        self._templates[path] = template
+        logger.info(f"Compiled prompt template {path} ({len(template.names)} placeholders)")
+        return template
+
+    def get(self, path: str) -> PromptTemplate:
+        template = self._templates.get(path)
+        if template is None:
+            return self._load(path)
+        if settings.PROMPT_TEMPLATE_RELOAD and os.stat(path).st_mtime != template.mtime:
+            return self._load(path)
+        return template
+
+    def validate(self, required: Mapping[str, Iterable[str]]):
+        """Load every template and fail fast if a file or an expected placeholder is missing."""
+        for path, names in required.items():
+            template = self.get(path)
+            missing = set(names) - template.placeholders
+            if missing:
+                raise ValueError(f"{path} does not contain placeholders {sorted(missing)}")
+
+
+prompt_registry = TemplateRegistry()
+
+
 def build_prompt(template_path: str, replacements: Dict[str, str]) -> str:
-    prompt = read_file(template_path)
-    for key, value in replacements.items():
-        prompt = prompt.replace(key, value)
-    return prompt
+    """Render a registered template. Keys may be given as NAME or {{NAME}}."""
+    values = {key.strip("{}"): value for key, value in replacements.items()}
+    return prompt_registry.get(template_path).render(values)
 
 def clean_json_response(text: str) -> str:
     text = text.strip()
@@ -29,3 +92,10 @@ def extract_json_from_text(text: str) -> str:
     if start_idx != -1 and end_idx != -1:
         return text[start_idx:end_idx+1]
     return text
+
+def parse_json_response(text: str) -> Dict:
+    """Parse the JSON object in an LLM response; raises ValueError if there is none."""
+    data = json.loads(extract_json_from_text(text))
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object in the response")
+    return data
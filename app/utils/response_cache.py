@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.config import settings
+
+# (universe_id, collection, path, query string)
+CacheKey = Tuple[str, str, str, str]
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    expires_at: float
+    headers: Dict[str, str]
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compare an If-None-Match header against our ETag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """
+    In-process LRU/TTL cache of encoded public responses.
+    Entries are tagged with the universe and collection they were read from,
+    so a write invalidates exactly the responses it can change.
+    """
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        # Bumped on every invalidation so a read that raced a write is never stored
+        self._generations: Dict[Tuple[str, Optional[str]], int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, universe_id: str, collection: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._generations.get((universe_id, None), 0), self._generations.get((universe_id, collection), 0)
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: CacheKey, body: bytes, generation: Tuple[int, int], headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), time.monotonic() + self.ttl, headers or {})
+        with self._lock:
+            current = (self._generations.get((key[0], None), 0), self._generations.get((key[0], key[1]), 0))
+            if current != generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, universe_id: str, collection: Optional[str] = None):
+        """Drop cached responses for a universe, optionally only those built from one collection."""
+        with self._lock:
+            gen_key = (universe_id, collection)
+            self._generations[gen_key] = self._generations.get(gen_key, 0) + 1
+            stale = [
+                key for key in self._entries
+                if key[0] == universe_id and (collection is None or key[1] == collection)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL
+)
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.utils.logging import logger
+from app.utils.metrics import metrics
+
+STARTUP_SECONDS = metrics.gauge("app_startup_seconds", "Time spent importing the app and in each startup step", ["phase"])
+
+
+class StartupReport:
+    """
+    How long the process took to come up: importing `app.main`, then each startup
+    step. Steps moved off the critical path (index verification) are recorded when
+    they finish and reported separately, since they no longer delay serving.
+    """
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.background: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def record(self, phase: str, seconds: float, background: bool = False):
+        (self.background if background else self.phases)[phase] = seconds
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def ready(self):
+        """Mark startup complete and log the report."""
+        self.ready_at = time.time()
+        total = sum(self.phases.values())
+        STARTUP_SECONDS.set(total, phase="total")
+        steps = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Startup took {total:.3f}s ({steps})")
+
+    def summary(self) -> Dict:
+        return {
+            "ready": self.ready_at is not None,
+            "total_seconds": round(sum(self.phases.values()), 4),
+            "phases": {k: round(v, 4) for k, v in self.phases.items()},
+            "background": {k: round(v, 4) for k, v in self.background.items()},
+        }
+
+
+startup_report = StartupReport()
@@ -0,0 +1 @@
+"""Offline benchmarks for the pipeline and public API. Run from the repository root."""
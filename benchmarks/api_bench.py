@@ -0,0 +1,128 @@
+"""
+Load generator for the public read API.
+
+    python -m benchmarks.api_bench --days 5000 --concurrency 1,8,32,128
+    python -m benchmarks.api_bench --base-url http://localhost:8000 --no-seed
+
+By default the public router is served in-process over ASGI, so the numbers
+cover routing, the response cache, serialization and Mongo, but not the network.
+Reports throughput and p50/p99 latency per endpoint at each concurrency level.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import public
+from app.utils.response_cache import response_cache
+from benchmarks.harness import connect, percentile, quiet_logs, reset_universe, seed_days
+
+
+def build_app() -> FastAPI:
+    """The public routes as app.main mounts them, without startup hooks."""
+    app = FastAPI()
+    app.include_router(public.router)
+    app.include_router(public.router, prefix="/universes/{universe_id}")
+    return app
+
+
+def endpoints(universe_id: str, days: int) -> Dict[str, Callable[[random.Random], str]]:
+    base = f"/universes/{universe_id}"
+    return {
+        "timeline": lambda r: f"{base}/timeline?limit=20",
+        "timeline_deep_skip": lambda r: f"{base}/timeline?limit=20&skip={r.randrange(max(1, days - 20))}",
+        "timeline_keyset": lambda r: f"{base}/timeline?limit=20&before_day={r.randrange(1, days + 1)}",
+        "timeline_latest": lambda r: f"{base}/timeline/latest",
+        "timeline_day": lambda r: f"{base}/timeline/{r.randrange(1, days + 1)}",
+        "day": lambda r: f"{base}/days/{r.randrange(1, days + 1)}",
+        "days_range": lambda r: f"{base}/days?from={r.randrange(1, max(2, days - 20))}&limit=20",
+        "subtopics_summary": lambda r: f"{base}/subtopics?limit=50&summary=true",
+        "proposals": lambda r: f"{base}/proposals?limit=20",
+        "judgements": lambda r: f"{base}/judgements?limit=20",
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=2000, help="Days of data seeded before the run")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--endpoints", default="", help="Comma-separated subset of endpoint names")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory", help="mongomock or the Mongo at MONGO_URI")
+    parser.add_argument("--db-name", default="alternate_history_bench")
+    parser.add_argument("--universe", default="bench_universe")
+    parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the in-process response cache")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+async def load(client: httpx.AsyncClient, make_url: Callable[[random.Random], str], requests: int, concurrency: int, seed: int) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+    rng = random.Random(seed)
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            url = make_url(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run(args):
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app()), base_url="http://bench", timeout=60)
+
+    selected = endpoints(args.universe, args.days)
+    if args.endpoints:
+        selected = {name: selected[name] for name in args.endpoints.split(",")}
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    print(f"{'endpoint':<20} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    async with client:
+        for name, make_url in selected.items():
+            for concurrency in levels:
+                # Every measurement starts from a cold in-process response cache
+                response_cache.invalidate(args.universe)
+                latencies, errors, elapsed = await load(client, make_url, args.requests, concurrency, args.seed)
+                print(
+                    f"{name:<20} {concurrency:>5} {len(latencies) / elapsed:>9.1f} "
+                    f"{percentile(latencies, 0.5) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} {errors:>7}"
+                )
+
+
+def main():
+    args = parse_args()
+    quiet_logs()
+    if args.no_cache:
+        response_cache.max_entries = 0
+    if not args.no_seed:
+        connect(args.backend, args.db_name)
+        reset_universe(args.universe)
+        seed_days(args.universe, args.days, seed=args.seed)
+    elif not args.base_url:
+        connect(args.backend, args.db_name)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Sequence
+
+import pytz
+
+from app.config import settings
+from app.database import db
+from app.services.llm_service import llm_service
+from app.services.search import SEARCH_COLLECTION
+from app.services.unit_of_work import STAGING_COLLECTION, DayUnitOfWork, import_days
+from app.utils.logging import logger
+
+SEED_FILE = "universe/universe_seed.json"
+
+WORDS = [
+    "soviet", "nasa", "budget", "crisis", "mars", "summit", "probe", "cabinet", "reactor", "satellite",
+    "treaty", "engineer", "press", "senate", "moscow", "houston", "launch", "orbit", "defector", "strike",
+    "uprising", "election", "pipeline", "embargo", "tariff", "refinery", "census", "cosmonaut", "lunar",
+    "station", "espionage", "journalist", "protest", "union", "harvest", "drought", "doctrine", "frontier",
+    "academy", "telescope", "broadcast", "computer", "missile", "submarine", "island", "border", "courier",
+    "archive", "tribunal", "festival", "pavilion", "rocket", "factory", "minister", "general", "admiral",
+    "scientist", "student", "riot", "referendum", "currency", "gold", "oil", "grain", "railway", "canal",
+]
+
+
+def quiet_logs():
+    """Keep per-stage INFO lines out of benchmark output."""
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logger.setLevel(logging.WARNING)
+
+
+class FakeProvider:
+    """
+    Stand-in for an LLM provider with controllable latency, jitter, failure
+    rate and output size. Every answer is valid JSON for any pipeline stage,
+    and subtopics are unique, so the duplicate filter behaves as in production.
+    """
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, output_chars: int = 1500, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.output_chars = output_chars
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(f"{name}-{seed}")
+
+    async def __call__(self, prompt: str, on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        self.calls += 1
+        delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError(f"{self.name}: simulated provider failure")
+        text = json.dumps(self._answer())
+        if on_delta:
+            # Streamed like a provider would, a few tokens per chunk
+            for start in range(0, len(text), 64):
+                await on_delta(text[start:start + 64])
+        return text
+
+    def _answer(self) -> Dict[str, Any]:
+        words = self._rng.sample(WORDS, 5)
+        subtopic = " ".join(words) + f" #{self.calls}-{self._rng.randrange(10**6)}"
+        event = {
+            "title": f"The {words[0]} {words[1]} affair",
+            "summary": " ".join(self._rng.choices(WORDS, k=30)),
+            "event_type": self._rng.choice(["political", "technological", "economic", "military"]),
+            "date_in_universe": "1970-01-01",
+        }
+        padding = max(0, self.output_chars - len(json.dumps(event)) - len(subtopic) - 200)
+        event["details"] = " ".join(self._rng.choices(WORDS, k=padding // 8))[:padding]
+        return {
+            "selected_subtopic": subtopic,
+            "reason": "benchmark",
+            "expected_focus_tags": words[:3],
+            "decision": self._rng.choice(["A", "B"]),
+            "accepted_log": event,
+            **event,
+        }
+
+
+def install_fake_providers(names: Sequence[str] = ("qwen", "gemini", "deepseek", "groq"), **options) -> Dict[str, FakeProvider]:
+    fakes = {name: FakeProvider(name, **options) for name in names}
+    for name, fake in fakes.items():
+        llm_service.register_provider(name, fake)
+    return fakes
+
+
+def _patch_mongomock_bulk_writes(mongomock):
+    """mongomock 4.3 predates the `sort` option pymongo 4.9+ passes when queuing bulk replaces and updates."""
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ("add_replace", "add_update"):
+        original = getattr(builder, name)
+        if getattr(original, "_drops_sort", False):
+            continue
+
+        def patched(self, *args, _original=original, sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+        patched._drops_sort = True
+        setattr(builder, name, patched)
+
+
+def connect(backend: str, db_name: str):
+    """Point the app's Database at a local Mongo (`local`) or an in-memory mongomock (`memory`)."""
+    if backend == "memory":
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("The in-memory backend needs mongomock: pip install mongomock")
+        _patch_mongomock_bulk_writes(mongomock)
+        db.client = mongomock.MongoClient()
+        db.db = db.client[db_name]
+        db._ensure_indexes()
+    else:
+        settings.DB_NAME = db_name
+        db.connect()
+
+
+def reset_universe(universe_id: str):
+    """Clear a benchmark universe and store its seed document."""
+    for name in ["timeline", "subtopics", "proposals", "judgements", SEARCH_COLLECTION, STAGING_COLLECTION, "simulation_jobs"]:
+        db.get_collection(name).delete_many({"universe_id": universe_id})
+    with open(SEED_FILE, "r", encoding="utf-8") as f:
+        seed = json.load(f)
+    db.get_collection("universe").replace_one({"universe_id": universe_id}, {**seed, "universe_id": universe_id}, upsert=True)
+
+
+def fake_days(universe_id: str, days: int, output_chars: int = 1500, seed: int = 0) -> Iterator[DayUnitOfWork]:
+    """Complete days with every document a simulated day commits, built without the LLM stages."""
+    fake = FakeProvider("seed", output_chars=output_chars, seed=seed)
+    created_at = datetime.now(pytz.timezone("Asia/Kolkata"))
+
+    for day_index in range(1, days + 1):
+        answer = fake._answer()
+        prefix = f"{universe_id}-{day_index}"
+        base = {"universe_id": universe_id, "day_index": day_index, "created_at": created_at}
+        day = DayUnitOfWork(universe_id, day_index)
+        day.add("subtopics", {**base, "_id": f"{prefix}-subtopic", "selected_subtopic": answer["selected_subtopic"], "reason": answer["reason"], "tags": answer["expected_focus_tags"]})
+        for model in ("A", "B"):
+            day.add("proposals", {**base, "_id": f"{prefix}-{model}-0", "model": model, **answer["accepted_log"], "subtopic": answer["selected_subtopic"]})
+        day.add("judgements", {**base, "_id": f"{prefix}-judgment", "decision": answer["decision"], "reason": answer["reason"]})
+        day.add("timeline", {**base, "_id": f"{prefix}-0", "subtopic": answer["selected_subtopic"], "event": answer["accepted_log"]})
+        yield day
+
+
+def seed_days(universe_id: str, days: int, output_chars: int = 1500, seed: int = 0):
+    """Backfill `days` complete days into a reset universe through the bulk import path, for read benchmarks."""
+    asyncio.run(import_days(fake_days(universe_id, days, output_chars, seed), batch_days=1000, upsert=False))
+
+
+def percentile(samples: Sequence[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
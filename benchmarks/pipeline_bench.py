@@ -0,0 +1,111 @@
+"""
+End-to-end pipeline benchmark against fake LLM providers.
+
+    python -m benchmarks.pipeline_bench --days 2000 --report-every 250
+    python -m benchmarks.pipeline_bench --backend local --latency 0.5 --jitter 0.2 --failure-rate 0.05
+
+Runs `PipelineService.run_daily_simulation` day after day and reports per-stage
+latency and days-per-minute as the timeline grows.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import Dict, List
+
+from app.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.pipeline import pipeline_service
+from benchmarks.harness import connect, install_fake_providers, percentile, quiet_logs, reset_universe, seed_days
+
+STAGES = ["subtopic", "proposals", "judgement", "total"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=500, help="Days to simulate")
+    parser.add_argument("--preseed", type=int, default=0, help="Complete days bulk-inserted before the run starts")
+    parser.add_argument("--report-every", type=int, default=100, help="Print a row every N days")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean fake provider latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability a fake call fails")
+    parser.add_argument("--output-chars", type=int, default=1500, help="Approximate size of each fake answer")
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory", help="mongomock or the Mongo at MONGO_URI")
+    parser.add_argument("--db-name", default="alternate_history_bench")
+    parser.add_argument("--universe", default="bench_universe")
+    parser.add_argument("--snapshots", action="store_true", help="Write static snapshots after each day, as production does")
+    parser.add_argument("--rpm", default="", help="LLM_RPM for the run, e.g. groq=600; unlimited by default")
+    parser.add_argument("--tpm", default="", help="LLM_TPM for the run; unlimited by default")
+    parser.add_argument("--backoff-base", type=float, default=None, help="Override LLM_BACKOFF_BASE for failure runs")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def report(day: int, window: List[Dict[str, float]], window_seconds: float):
+    days_per_minute = len(window) / window_seconds * 60 if window_seconds else float("inf")
+    cells = []
+    for stage in STAGES:
+        samples = [t[stage] for t in window if stage in t]
+        cells.append(f"{percentile(samples, 0.5) * 1000:9.1f}")
+    total = [t["total"] for t in window]
+    print(f"{day:>7} {days_per_minute:>10.1f} {' '.join(cells)} {percentile(total, 0.99) * 1000:9.1f}")
+
+
+async def run(args):
+    if args.backoff_base is not None:
+        settings.LLM_BACKOFF_BASE = args.backoff_base
+    # Production free-tier limits would measure the limiter, not the pipeline
+    settings.LLM_RPM = args.rpm
+    settings.LLM_TPM = args.tpm
+    fakes = install_fake_providers(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        output_chars=args.output_chars,
+        seed=args.seed
+    )
+
+    print(f"{'day':>7} {'days/min':>10} {'subtopic':>9} {'proposal':>9} {'judge':>9} {'total':>9} {'p99':>9}  (p50 ms unless noted)")
+    window: List[Dict[str, float]] = []
+    window_start = time.perf_counter()
+    run_start = window_start
+    failed_days = 0
+
+    for i in range(1, args.days + 1):
+        try:
+            result = await pipeline_service.run_daily_simulation(args.universe)
+            window.append(result["timings"])
+        except Exception as e:
+            failed_days += 1
+            print(f"day {args.preseed + i} failed: {e}")
+        if i % args.report_every == 0 or i == args.days:
+            now = time.perf_counter()
+            if window:
+                report(args.preseed + i, window, now - window_start)
+            window, window_start = [], now
+
+    elapsed = time.perf_counter() - run_start
+    print(f"\n{args.days} days in {elapsed:.1f}s ({args.days / elapsed * 60:.1f} days/min), {failed_days} failed")
+    for name, fake in fakes.items():
+        print(f"  {name:<9} calls={fake.calls} failures={fake.failures} calls/min={fake.calls / elapsed * 60:.1f}")
+
+
+def main():
+    args = parse_args()
+    quiet_logs()
+    # Recorded responses would bypass the fake providers
+    llm_cache.mode = "off"
+    if args.snapshots:
+        settings.SNAPSHOT_DIR = tempfile.mkdtemp(prefix="snapshots-")
+    else:
+        settings.SNAPSHOT_DIR = ""
+    connect(args.backend, args.db_name)
+    reset_universe(args.universe)
+    pipeline_service.reset_subtopic_index(args.universe)
+    if args.preseed:
+        seed_days(args.universe, args.preseed, args.output_chars, args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()